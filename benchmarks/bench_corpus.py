@@ -0,0 +1,66 @@
+"""Benchmarks of the creation of the corpora : picto ids and sense keys of the reference sentences
+(create_corpus_from_eval_magali.py), UFSAC xml files (convert_csv_to_UFSAC_format.py) with a stub spacy model,
+and statistics (generate_stats_corpus_s2p.py).
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import io
+import pytest
+from conftest import run
+from utils import *
+from create_corpus_from_eval_magali import get_id_picto_and_senses_corpus
+from convert_csv_to_UFSAC_format import UFSACWriter, FragmentStore, add_info_to_xml_file_per_doc, linguistic_processing
+from generate_stats_corpus_s2p import (process_sentences, associate_words_with_pictos, build_token_table,
+                                       get_coverage_per_pos, vocabulary_size, get_mwe, count_mwe)
+
+
+@pytest.mark.benchmark(group="eval_magali")
+def bench_get_id_picto_and_senses_corpus(benchmark, scale, corpus, tokens_per_sentence, arasaac_table, wn31_index):
+    sentences = corpus['sentence'].tolist()
+    references = [' '.join(t[1] for t in tokens_per_sentence[linguistic_processing(s)]) for s in sentences]
+    infos = run(benchmark, scale, get_id_picto_and_senses_corpus, sentences, references, arasaac_table, wn31_index)
+    assert len(infos) == len(set(sentences))
+
+
+def generate_ufsac(corpus, stub_nlp, fragment_store=None):
+    output = io.StringIO()
+    with UFSACWriter(output) as writer:
+        add_info_to_xml_file_per_doc(corpus, writer, stub_nlp, fragment_store=fragment_store)
+    return output.getvalue()
+
+
+@pytest.mark.benchmark(group="ufsac")
+def bench_ufsac_generation(benchmark, scale, corpus, stub_nlp):
+    xml = run(benchmark, scale, generate_ufsac, corpus, stub_nlp)
+    assert xml.count('<sentence ') == len(corpus)
+
+
+@pytest.mark.benchmark(group="ufsac")
+def bench_ufsac_generation_from_fragments(benchmark, scale, corpus, stub_nlp, tmp_path):
+    fragment_store = FragmentStore(str(tmp_path / "fragments.sqlite"), "stub", "1")
+    generate_ufsac(corpus, stub_nlp, fragment_store)
+    xml = run(benchmark, scale, generate_ufsac, corpus, stub_nlp, fragment_store)
+    assert xml.count('<sentence ') == len(corpus)
+    fragment_store.close()
+
+
+@pytest.mark.benchmark(group="ufsac")
+def bench_ufsac_reading(benchmark, scale, corpus, stub_nlp):
+    xml = generate_ufsac(corpus, stub_nlp)
+    sentences = run(benchmark, scale, lambda: sum(1 for _ in iter_ufsac_sentences(io.StringIO(xml))))
+    assert sentences == len(corpus)
+
+
+def compute_stats(corpus, stub_nlp):
+    words = process_sentences(corpus['sentence'].tolist(), stub_nlp)
+    words = associate_words_with_pictos(words, corpus['pictos_ref_ids'].tolist())
+    table = build_token_table(words)
+    return get_coverage_per_pos(table), vocabulary_size(table), count_mwe(get_mwe(words))
+
+
+@pytest.mark.benchmark(group="stats")
+def bench_stats(benchmark, scale, corpus, stub_nlp):
+    per_pos, vocabulary, mwe = run(benchmark, scale, compute_stats, corpus, stub_nlp)
+    assert vocabulary
@@ -0,0 +1,76 @@
+"""Benchmark of `utils.parse_list_column` against `ast.literal_eval` row by row,
+on the list columns of corpora/t2p/all.csv repeated a given number of times.
+
+Example of use:
+python bench_parse_list_column.py --csv_file ../corpora/t2p/all.csv --scale 100
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import os
+import sys
+import ast
+import time
+import pandas as pd
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from utils import *
+
+
+def best_time(function, repeat):
+    """
+        Function to get the best execution time of a function.
+
+        Arguments
+        ---------
+        function : callable
+            Function without arguments to time.
+        repeat : int
+            Number of executions.
+
+        Returns
+        -------
+        The best time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark(args):
+    """Function to time the parsers on each list column of the scaled corpus."""
+    data = read_csv(args.csv_file)
+    data = pd.concat([data] * args.scale, ignore_index=True)
+    print("*** " + str(len(data)) + " rows (" + str(args.scale) + "x " + args.csv_file + ") ***\n")
+    for column in LIST_COLUMNS:
+        cells = data[column]
+        reference = [ast.literal_eval(c) for c in cells]
+        if parse_list_column(cells) != reference:
+            raise RuntimeError("parse_list_column does not give the same result as literal_eval on " + column)
+        literal = best_time(lambda: [ast.literal_eval(c) for c in cells], args.repeat)
+        nested = best_time(lambda: parse_list_column(cells), args.repeat)
+        flat = best_time(lambda: parse_list_column(cells, flat=True), args.repeat)
+        print(column + " : literal_eval " + str(round(literal, 3)) + "s, parse_list_column " + str(round(nested, 3))
+              + "s (x" + str(round(literal / nested, 1)) + "), flat " + str(round(flat, 3)) + "s (x"
+              + str(round(literal / flat, 1)) + ")")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the parser of the list columns against literal_eval.",
+                            formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--csv_file', type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                                     'corpora', 't2p', 'all.csv'),
+                        help="Path of the .csv corpus file.")
+    parser.add_argument('--scale', type=int, default=100,
+                        help="Number of times the corpus is repeated.")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Number of executions of each parser (the best time is kept).")
+    parser.set_defaults(func=benchmark)
+    args = parser.parse_args()
+    args.func(args)
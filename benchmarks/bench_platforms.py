@@ -0,0 +1,31 @@
+"""Benchmarks of the creation of the json files for InteraactionPicto platforms, on the synthetic arasaac data.
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import pytest
+from create_json_files_for_InteraactionPicto_platforms import (ingest_picto_files, get_wordnet_synsets_from_arasaac,
+                                                               get_lemma_from_wolf_and_corresponding_synsets)
+
+
+@pytest.mark.benchmark(group="platforms")
+@pytest.mark.parametrize("workers", [1, None])
+def bench_ingest_picto_files(benchmark, arasaac_jsons, workers):
+    keywords, synsets = benchmark.pedantic(ingest_picto_files, (arasaac_jsons, workers), rounds=3, iterations=1)
+    assert keywords and synsets
+
+
+@pytest.mark.benchmark(group="platforms")
+def bench_synsets_json(benchmark, arasaac_jsons, wn31_index, synset_table):
+    _, synsets = ingest_picto_files(arasaac_jsons, 1)
+    saved_data = benchmark(get_wordnet_synsets_from_arasaac, synsets, wn31_index, synset_table)
+    assert saved_data
+
+
+@pytest.mark.benchmark(group="platforms")
+def bench_synsets_fr_json(benchmark, arasaac_table, wn31_index, synset_table):
+    picto_table = arasaac_table[['lemma', 'synset2', 'lemma_plural']]
+    results = benchmark.pedantic(get_lemma_from_wolf_and_corresponding_synsets, (picto_table, wn31_index, synset_table),
+                                 rounds=3, iterations=1)
+    assert results
@@ -0,0 +1,53 @@
+"""Benchmarks of the readers and lookups of `utils`.
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import pytest
+from conftest import run
+from utils import *
+
+
+@pytest.mark.benchmark(group="read_corpus")
+def bench_read_corpus(benchmark, scale, corpus_file):
+    data = run(benchmark, scale, read_corpus, corpus_file)
+    assert len(data) == 897 * scale
+
+
+@pytest.mark.benchmark(group="parse_list_column")
+def bench_parse_list_column(benchmark, scale, corpus):
+    column = corpus['sense_keys'].map(str)
+    values = run(benchmark, scale, parse_list_column, column)
+    assert len(values) == len(column)
+
+
+@pytest.mark.benchmark(group="wordnet_index")
+def bench_load_wn31_index(benchmark, wn31_file):
+    index = benchmark(load_wn31_index, wn31_file)
+    assert len(index)
+
+
+@pytest.mark.benchmark(group="wordnet_index")
+def bench_lookup_many(benchmark, wn31_index, arasaac_table):
+    synsets = arasaac_table['synset2'].tolist()
+    sense_keys = benchmark(wn31_index.lookup_many, synsets)
+    assert len(sense_keys) == len(synsets)
+
+
+@pytest.mark.benchmark(group="arasaac_index")
+def bench_build_lemma_index(benchmark, arasaac_table):
+    index = benchmark(build_lemma_index, arasaac_table)
+    assert len(index) == len(arasaac_table)
+
+
+@pytest.mark.benchmark(group="synset_names")
+def bench_synset_name_lookup(benchmark, synset_table, wn31_index, arasaac_table):
+    sense_keys = [k for keys in wn31_index.lookup_many(arasaac_table['synset2'].tolist()) for k in keys]
+
+    def lookup_all():
+        synset_table.lookup.cache_clear()
+        return [synset_table.lookup(k) for k in sense_keys]
+
+    names = benchmark(lookup_all)
+    assert None not in names
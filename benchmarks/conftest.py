@@ -0,0 +1,187 @@
+"""Fixtures of the benchmark suite : synthetic corpora built from corpora/t2p/all.csv at several scales,
+a stub spacy model, and synthetic arasaac table, index.sense, picto json files and synset name table.
+
+The corpora are corpora/t2p/all.csv repeated 1, 10 and 100 times (each copy with its own document names), the
+scales can be restricted with the BENCH_SCALES environment variable (e.g. BENCH_SCALES=1,10).
+The arasaac data has the size of the real data (data/arasaac.fre30bis.csv) whatever the scale.
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import os
+import sys
+import json
+import pytest
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from utils import *
+from convert_csv_to_UFSAC_format import linguistic_processing
+
+CORPUS_FILE = os.path.join(ROOT, 'corpora', 't2p', 'all.csv')
+UFSAC_FILE = os.path.join(ROOT, 'corpora', 'wsd', 'all.xml')
+SCALES = [int(s) for s in os.environ.get("BENCH_SCALES", "1,10,100").split(',')]
+# rounds of each benchmark per scale, so the 100x benchmarks stay short
+ROUNDS = {1: 5, 10: 3, 100: 1}
+NUM_ARASAAC_ROWS = 36000
+NUM_PICTOS = 13000
+NUM_SYNSETS = 12000
+
+
+def pytest_generate_tests(metafunc):
+    if "scale" in metafunc.fixturenames:
+        metafunc.parametrize("scale", SCALES, scope="session")
+
+
+def run(benchmark, scale, function, *args):
+    """
+        Function to benchmark a function with a number of rounds depending on the scale.
+
+        Arguments
+        ---------
+        benchmark : fixture
+            `benchmark` fixture of pytest-benchmark.
+        scale : int
+            Scale of the corpus.
+        function : callable
+        args :
+            Arguments of the function.
+
+        Returns
+        -------
+        The result of the function.
+    """
+    return benchmark.pedantic(function, args, rounds=ROUNDS.get(scale, 1), iterations=1)
+
+
+class StubToken:
+    def __init__(self, text, lemma, pos):
+        self.text = text
+        self.lemma_ = lemma
+        self.pos_ = pos
+
+
+class StubNLP:
+    """Class which mimics a spacy model : the tokens of the sentences of the corpus are read from corpora/wsd/all.xml
+    (the UFSAC file created from corpora/t2p/all.csv). The sentences are looked up after `linguistic_processing`,
+    so the sentences given by the converter (already processed) and the raw sentences give the same tokens."""
+
+    def __init__(self, tokens_per_sentence):
+        self.tokens_per_sentence = tokens_per_sentence
+
+    def pipe(self, sentences, batch_size=32, n_process=1):
+        for sentence in sentences:
+            tokens = self.tokens_per_sentence.get(linguistic_processing(sentence))
+            assert tokens is not None, "Sentence not in the corpus : " + sentence
+            yield [StubToken(*t) for t in tokens]
+
+
+@pytest.fixture(scope="session")
+def base_corpus():
+    return read_corpus(CORPUS_FILE)
+
+
+@pytest.fixture(scope="session")
+def tokens_per_sentence(base_corpus):
+    """Tokens of each sentence of corpora/t2p/all.csv (after `linguistic_processing`, as given to the model by the
+    converter), from the UFSAC sentences in the same order (documents sorted by name). A few sentences of the xml
+    file have a different tokenization than the csv file, their tokens are cut or completed to have one token per
+    word of the csv file."""
+    rows = base_corpus.sort_values("doc_name", kind="stable")
+    tokens = {}
+    for (sentence, sense_keys), ufsac_sentence in zip(zip(rows['sentence'], rows['sense_keys']),
+                                                      iter_ufsac_sentences(UFSAC_FILE)):
+        words = [(w["surface_form"], w["lemma"], w["pos"]) for w in ufsac_sentence["words"]][:len(sense_keys)]
+        words += [('x', 'x', 'X')] * (len(sense_keys) - len(words))
+        tokens.setdefault(linguistic_processing(sentence), words)
+    return tokens
+
+
+@pytest.fixture(scope="session")
+def stub_nlp(tokens_per_sentence):
+    return StubNLP(tokens_per_sentence)
+
+
+@pytest.fixture(scope="session")
+def corpus(base_corpus, scale):
+    """Corpus repeated `scale` times, each copy with its own document names."""
+    copies = []
+    for r in range(scale):
+        copy = base_corpus.copy()
+        if r:
+            copy['doc_name'] = copy['doc_name'] + '_' + str(r)
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+@pytest.fixture(scope="session")
+def corpus_file(corpus, scale, tmp_path_factory):
+    """The scaled corpus saved as a .csv file, with the list columns written as strings."""
+    path = str(tmp_path_factory.mktemp("corpus") / ("all_" + str(scale) + ".csv"))
+    data = corpus.copy()
+    for column in LIST_COLUMNS:
+        data[column] = data[column].map(str)
+    data.to_csv(path, sep='\t', index=False)
+    return path
+
+
+@pytest.fixture(scope="session")
+def arasaac_table(tokens_per_sentence):
+    """Synthetic arasaac.fre30bis table, with the lemmas of the corpus and other lemmas to reach the real size."""
+    lemmas = list(dict.fromkeys(t[1] for tokens in tokens_per_sentence.values() for t in tokens))
+    lemmas += ['lemme' + str(i) for i in range(NUM_ARASAAC_ROWS - len(lemmas))]
+    synsets2 = ['%08d-n' % ((i * 7) % NUM_SYNSETS + 1) for i in range(len(lemmas))]
+    return pd.DataFrame({'idpicto': [i % NUM_PICTOS for i in range(len(lemmas))],
+                         'lemma': lemmas,
+                         'synset': ['fre-30-' + s for s in synsets2],
+                         'synset2': synsets2,
+                         'lemma_plural': [lemma + 's' if i % 2 else r"\N" for i, lemma in enumerate(lemmas)]})
+
+
+@pytest.fixture(scope="session")
+def wn31_file(tmp_path_factory):
+    """Synthetic index.sense file, with 2 sense keys per synset."""
+    path = str(tmp_path_factory.mktemp("wordnet") / "index.sense")
+    with open(path, 'w') as f:
+        for offset in range(1, NUM_SYNSETS + 1):
+            for sense in range(2):
+                f.write('mot' + str(offset) + '_' + str(sense) + '%1:0' + str(offset % 10) + ':00:: '
+                        + '%08d' % offset + ' ' + str(sense + 1) + ' 0\n')
+    return path
+
+
+@pytest.fixture(scope="session")
+def wn31_index(wn31_file):
+    return load_wn31_index(wn31_file)
+
+
+@pytest.fixture(scope="session")
+def synset_table(wn31_file, tmp_path_factory):
+    """Synset name table of the sense keys of the synthetic index.sense."""
+    table = SynsetNameTable(str(tmp_path_factory.mktemp("synsets") / "synset_names.sqlite"))
+    with open(wn31_file, 'r') as f:
+        table.add_many((line.split()[0], 'synset.n.' + line.split()[1]) for line in f)
+    yield table
+    table.close()
+
+
+@pytest.fixture(scope="session")
+def arasaac_jsons(arasaac_table, tmp_path_factory):
+    """Directory with one arasaac json file per picto of the synthetic table."""
+    outdir = tmp_path_factory.mktemp("arasaac_jsons")
+    pictos = {}
+    for id_picto, lemma, synset, plural in zip(arasaac_table['idpicto'], arasaac_table['lemma'],
+                                               arasaac_table['synset2'], arasaac_table['lemma_plural']):
+        picto = pictos.setdefault(int(id_picto), {"_id": int(id_picto), "keywords": [], "synsets": []})
+        keyword = {"keyword": lemma}
+        if plural != r"\N":
+            keyword["plural"] = plural
+        picto["keywords"].append(keyword)
+        picto["synsets"].append(synset)
+    for id_picto, picto in pictos.items():
+        with open(outdir / (str(id_picto) + '.json'), 'w') as f:
+            json.dump(picto, f)
+    return str(outdir) + '/'
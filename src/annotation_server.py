@@ -0,0 +1,157 @@
+"""Annotation server which keeps the spacy models and stanza pipelines loaded between the runs of the scripts.
+While it is running, `utils.iter_annotations` (convert_csv_to_UFSAC_format.py, create_corpus_polysemous_magali.py,
+generate_stats_corpus_s2p.py) and sentences_to_lemmas_and_picto_ids.py send their sentences to it instead of
+loading the models, and they load the models themselves when it is not running.
+
+The server listens on a Unix socket (utils.ANNOTATION_SERVER_SOCKET, or the ANNOTATION_SERVER_SOCKET environment
+variable), in $XDG_RUNTIME_DIR or with the uid in its name, and only the user running the server can connect to it.
+Each request is a json object on one line :
+    {"backend": "spacy", "model": "fr_dep_news_trf", "sentences": ["..."], "batch_size": 32}
+and the answer is {"annotations": [[[text, lemma, pos], ...], ...]} or {"error": "..."}.
+Only the models loaded at startup are used, the request {"command": "models"} lists them :
+    {"spacy": ["fr_dep_news_trf"], "stanza": ["fr"]}
+
+Example of use:
+python annotation_server.py --spacy_models fr_dep_news_trf --stanza_langs fr
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import threading
+import socketserver
+from utils import *
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+# the models are not thread safe, the requests of the clients are annotated one at a time
+model_lock = threading.Lock()
+
+
+def annotate(backend, model, sentences, batch_size=32, models=None):
+    """
+        Function to annotate sentences with a model loaded at the startup of the server.
+
+        Arguments
+        ---------
+        backend : str
+            "spacy" or "stanza".
+        model : str
+            Name of the spacy model, or language of the stanza pipeline.
+        sentences : list[str]
+        batch_size : int
+            Number of sentences sent together to the model.
+        models : dict
+            Models loaded for each backend, the other models are refused.
+
+        Returns
+        -------
+        A list with, for each sentence, the list of (text, lemma, pos) tuples of its tokens (words for stanza).
+    """
+    if backend not in ["spacy", "stanza"]:
+        raise ValueError("Unknown backend " + str(backend))
+    if models is None or model not in models[backend]:
+        raise ValueError("Model not loaded by the server : " + str(model))
+    if backend == "spacy":
+        nlp = load_spacy_model(model)
+        return [[(token.text, token.lemma_, token.pos_) for token in doc]
+                for doc in nlp.pipe(sentences, batch_size=batch_size)]
+    if backend == "stanza":
+        nlp = load_stanza_pipeline(model)
+        annotations = []
+        for batch in iter_chunks(sentences, batch_size):
+            for doc in nlp.bulk_process(batch):
+                annotations.append([(word.text, word.lemma, word.pos) for sent in doc.sentences for word in sent.words])
+        return annotations
+
+
+class AnnotationRequestHandler(socketserver.StreamRequestHandler):
+    """Class which answers the requests of a client until it closes the connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("command") == "models":
+                    answer = self.server.models
+                else:
+                    with model_lock:
+                        annotations = annotate(request["backend"], request["model"], request["sentences"],
+                                               request.get("batch_size", 32), self.server.models)
+                    answer = {"annotations": annotations}
+            except Exception as e:
+                answer = {"error": repr(e)}
+            self.wfile.write(json.dumps(answer, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class AnnotationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Server whose socket can only be used by its owner, and which only serves the models given at startup."""
+    daemon_threads = True
+
+    def __init__(self, socket_path, handler, models):
+        self.models = models
+        # the socket file is created with the permissions 0o600
+        umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, handler)
+        finally:
+            os.umask(umask)
+
+
+def remove_stale_socket(socket_path):
+    """
+        Function to remove the socket file left by a server which was stopped without cleaning it.
+        Only a socket owned by the current user is removed.
+
+        Arguments
+        ---------
+        socket_path : str
+            Path of the Unix socket.
+    """
+    if not os.path.lexists(socket_path):
+        return
+    if not is_own_socket(socket_path):
+        raise RuntimeError(socket_path + " exists and is not a socket of the current user")
+    client = connect_annotation_server(socket_path)
+    if client is not None:
+        client.close()
+        raise RuntimeError("An annotation server is already running on " + socket_path)
+    os.remove(socket_path)
+
+
+def run_server(args):
+    """Function to load the models and answer the annotation requests until the server is stopped."""
+    for model in args.spacy_models:
+        load_spacy_model(model)
+    for lang in args.stanza_langs:
+        load_stanza_pipeline(lang)
+    models = {"spacy": list(args.spacy_models), "stanza": list(args.stanza_langs)}
+    remove_stale_socket(args.socket)
+    with AnnotationServer(args.socket, AnnotationRequestHandler, models) as server:
+        print("*** Annotation server ready on " + args.socket + " ***\n")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(args.socket)
+
+
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--socket', type=str, default=ANNOTATION_SERVER_SOCKET,
+                        help="Path of the Unix socket of the server.")
+    parser.add_argument('--spacy_models', type=str, nargs='*', default=["fr_dep_news_trf"],
+                        help="Spacy models loaded at startup (the only ones served).")
+    parser.add_argument('--stanza_langs', type=str, nargs='*', default=[],
+                        help="Languages of the stanza pipelines loaded at startup (the only ones served).")
+    parser.set_defaults(func=run_server)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Run a server which keeps the annotation models loaded.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("annotation_server")
+    args.func(args)
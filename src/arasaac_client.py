@@ -0,0 +1,184 @@
+"""Asynchronous client for the ARASAAC API, shared by the scripts which need info about pictograms.
+The connections are kept alive and reused in a pool, and the number of requests in flight is bounded.
+
+The url of the API can be changed with the ARASAAC_API_URL environment variable (e.g. to use a local server).
+
+Example of use:
+    ids = fetch_pictograms([2239, 2242])
+    results = search(["abeille", "manteau"])
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import os
+import asyncio
+import aiohttp
+from urllib.parse import quote
+
+API_URL = os.environ.get("ARASAAC_API_URL", "https://api.arasaac.org/api")
+
+
+class ArasaacClient:
+    """Class which sends requests to the ARASAAC API through a pool of keep-alive connections.
+    It must be used as an async context manager :
+
+        async with ArasaacClient() as client:
+            data = await client.fetch_pictograms(ids)
+    """
+
+    def __init__(self, base_url=API_URL, language="fr", max_connections=16, max_concurrency=16, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.language = language
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.session = None
+        self.semaphore = None
+        self.num_requests = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                             headers={"accept": "application/json"})
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.session.close()
+
+    async def get_json(self, path, not_found=None):
+        """
+            Function to send a GET request to the API and decode the json answer.
+
+            Arguments
+            ---------
+            path : str
+                Path of the request, relative to the url of the API.
+            not_found : object
+                Value returned if the API answers 404.
+
+            Returns
+            -------
+            The decoded json data.
+        """
+        async with self.semaphore:
+            self.num_requests += 1
+            async with self.session.get(self.base_url + path) as response:
+                if response.status == 404:
+                    return not_found
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def fetch_pictogram(self, id_picto):
+        """
+            Function to get the json info of a picto.
+
+            Arguments
+            ---------
+            id_picto : int
+                Picto id.
+
+            Returns
+            -------
+            The json info of the picto, None if the picto does not exist.
+        """
+        return await self.get_json('/pictograms/' + self.language + '/' + str(id_picto))
+
+    async def fetch_pictograms(self, ids_picto, return_exceptions=False):
+        """
+            Function to get the json info of several pictos concurrently.
+
+            Arguments
+            ---------
+            ids_picto : list[int]
+                Picto ids.
+            return_exceptions : bool
+                If True, a failed request gives its exception in the results instead of raising it.
+
+            Returns
+            -------
+            A list with the json info of each picto, in the same order as the ids.
+        """
+        return await asyncio.gather(*[self.fetch_pictogram(i) for i in ids_picto],
+                                    return_exceptions=return_exceptions)
+
+    async def search_word(self, word):
+        """
+            Function to search the pictos of a word.
+
+            Arguments
+            ---------
+            word : str
+
+            Returns
+            -------
+            A list with the json info of the pictos found (empty if none).
+        """
+        return await self.get_json('/pictograms/' + self.language + '/search/' + quote(word, safe=''), not_found=[])
+
+    async def search(self, words, return_exceptions=False):
+        """
+            Function to search the pictos of several words concurrently.
+
+            Arguments
+            ---------
+            words : list[str]
+            return_exceptions : bool
+                If True, a failed request gives its exception in the results instead of raising it.
+
+            Returns
+            -------
+            A list with, for each word, the json info of the pictos found.
+        """
+        return await asyncio.gather(*[self.search_word(w) for w in words], return_exceptions=return_exceptions)
+
+    async def fetch_all(self):
+        """
+            Function to get the json info of all the pictos of the language.
+
+            Returns
+            -------
+            A list with the json info of all the pictos.
+        """
+        return await self.get_json('/pictograms/all/' + self.language, not_found=[])
+
+
+def run_with_client(method, *args, **client_args):
+    """
+        Function to call a method of `ArasaacClient` from synchronous code.
+
+        Arguments
+        ---------
+        method : str
+            Name of the method of `ArasaacClient` to call.
+        args :
+            Arguments of the method.
+        client_args :
+            Arguments given to `ArasaacClient`.
+
+        Returns
+        -------
+        The result of the method.
+    """
+    async def main():
+        async with ArasaacClient(**client_args) as client:
+            return await getattr(client, method)(*args)
+
+    return asyncio.run(main())
+
+
+def fetch_pictograms(ids_picto, return_exceptions=False, **client_args):
+    """Synchronous version of `ArasaacClient.fetch_pictograms`."""
+    return run_with_client("fetch_pictograms", ids_picto, return_exceptions, **client_args)
+
+
+def search(words, return_exceptions=False, **client_args):
+    """Synchronous version of `ArasaacClient.search`."""
+    return run_with_client("search", words, return_exceptions, **client_args)
+
+
+def fetch_all(**client_args):
+    """Synchronous version of `ArasaacClient.fetch_all`."""
+    return run_with_client("fetch_all", **client_args)
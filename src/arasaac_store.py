@@ -0,0 +1,192 @@
+"""Local store (SQLite) of the info of all the ARASAAC pictograms, built from the dump of /pictograms/all/fr.
+Pictograms can then be resolved by id, keyword or synset without any request to the API.
+
+Example of use:
+    store = ArasaacStore("arasaac.sqlite")
+    store.ingest_file("all_pictos_arasaac.json")
+    store.by_id(2239)
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import json
+import sqlite3
+
+
+class ArasaacStore:
+    """Class which stores the json info of the pictograms with indexes on id, keyword, plural and synset."""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS pictograms (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS keywords (id INTEGER NOT NULL, keyword TEXT, plural TEXT);
+            CREATE TABLE IF NOT EXISTS synsets (id INTEGER NOT NULL, synset TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS keywords_keyword ON keywords (keyword);
+            CREATE INDEX IF NOT EXISTS keywords_plural ON keywords (plural);
+            CREATE INDEX IF NOT EXISTS keywords_id ON keywords (id);
+            CREATE INDEX IF NOT EXISTS synsets_synset ON synsets (synset);
+            CREATE INDEX IF NOT EXISTS synsets_id ON synsets (id);
+        """)
+
+    def ingest(self, pictograms):
+        """
+            Function to add (or replace) pictograms in the store.
+
+            Arguments
+            ---------
+            pictograms : list[dict]
+                Json info of the pictograms, as given by the ARASAAC API.
+
+            Returns
+            -------
+            The number of ingested pictograms.
+        """
+        ids = [(p['_id'],) for p in pictograms]
+        with self.connection:
+            self.connection.executemany("DELETE FROM keywords WHERE id = ?", ids)
+            self.connection.executemany("DELETE FROM synsets WHERE id = ?", ids)
+            self.connection.executemany("INSERT OR REPLACE INTO pictograms (id, data) VALUES (?, ?)",
+                                        [(p['_id'], json.dumps(p, ensure_ascii=False)) for p in pictograms])
+            self.connection.executemany("INSERT INTO keywords (id, keyword, plural) VALUES (?, ?, ?)",
+                                        [(p['_id'], k.get('keyword'), k.get('plural'))
+                                         for p in pictograms for k in p.get('keywords', [])])
+            self.connection.executemany("INSERT INTO synsets (id, synset) VALUES (?, ?)",
+                                        [(p['_id'], s) for p in pictograms for s in p.get('synsets', [])])
+        return len(ids)
+
+    def ingest_file(self, dump_file):
+        """
+            Function to add the pictograms of a json dump of /pictograms/all/fr in the store.
+
+            Arguments
+            ---------
+            dump_file : str
+                Path of the json dump.
+
+            Returns
+            -------
+            The number of ingested pictograms.
+        """
+        with open(dump_file, 'r') as f:
+            data = json.load(f)
+        # old dumps were saved as a json string containing the json answer
+        if isinstance(data, str):
+            data = json.loads(data)
+        return self.ingest(data)
+
+    def decode(self, rows):
+        """
+            Function to decode the json info of the pictograms returned by a query.
+
+            Arguments
+            ---------
+            rows : iterable[tuple]
+                Rows of the query, with the json info as first column.
+
+            Returns
+            -------
+            A list with the json info (dict) of each pictogram.
+        """
+        return [json.loads(r[0]) for r in rows]
+
+    def by_id(self, id_picto):
+        """
+            Function to get the json info of a picto.
+
+            Arguments
+            ---------
+            id_picto : int
+                Picto id.
+
+            Returns
+            -------
+            The json info of the picto, None if the picto is not in the store.
+        """
+        row = self.connection.execute("SELECT data FROM pictograms WHERE id = ?", (int(id_picto),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def by_ids(self, ids_picto):
+        """
+            Function to get the json info of several pictos.
+
+            Arguments
+            ---------
+            ids_picto : list[int]
+                Picto ids.
+
+            Returns
+            -------
+            A list with the json info of each picto (None if not in the store), in the same order as the ids.
+        """
+        return [self.by_id(i) for i in ids_picto]
+
+    def search_keyword(self, word):
+        """
+            Function to get the pictos which have the word as keyword or plural.
+
+            Arguments
+            ---------
+            word : str
+
+            Returns
+            -------
+            A list with the json info of the pictos found.
+        """
+        return self.decode(self.connection.execute(
+            "SELECT data FROM pictograms WHERE id IN "
+            "(SELECT id FROM keywords WHERE keyword = ? UNION SELECT id FROM keywords WHERE plural = ?) ORDER BY id",
+            (word, word)))
+
+    def by_synset(self, synset):
+        """
+            Function to get the pictos linked to a synset.
+
+            Arguments
+            ---------
+            synset : str
+                Synset as written by arasaac (e.g. "02209508-n").
+
+            Returns
+            -------
+            A list with the json info of the pictos found.
+        """
+        return self.decode(self.connection.execute(
+            "SELECT data FROM pictograms WHERE id IN (SELECT id FROM synsets WHERE synset = ?) ORDER BY id",
+            (synset,)))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM pictograms").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+def get_pictograms(ids_picto, store_path=None, return_exceptions=False):
+    """
+        Function to get the json info of pictos from the local store if given, else from the ARASAAC API.
+
+        Arguments
+        ---------
+        ids_picto : list[int]
+            Picto ids.
+        store_path : str
+            Path of the SQLite store, or None to use the API.
+        return_exceptions : bool
+            If True, a failed request gives its exception in the results instead of raising it.
+
+        Returns
+        -------
+        A list with the json info of each picto (None if unknown), in the same order as the ids.
+    """
+    if not store_path:
+        # aiohttp is only imported when the API is used
+        import arasaac_client
+        return arasaac_client.fetch_pictograms(ids_picto, return_exceptions)
+    store = ArasaacStore(store_path)
+    try:
+        return store.by_ids(ids_picto)
+    finally:
+        store.close()
@@ -0,0 +1,38 @@
+"""Build the table (SQLite) with the name of the wordnet synset of each sense key, from NLTK WordNet.
+The scripts which need synset names (e.g. create_json_files_for_InteraactionPicto_platforms.py) can then read it
+with `utils.load_synset_name_table` instead of loading WordNet.
+
+Example of use:
+python build_synset_name_table.py --synset_table synset_names.sqlite
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+from utils import *
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+
+def build_synset_name_table(args):
+    """Function to save the synset name of all the sense keys of NLTK WordNet."""
+    from nltk.corpus import wordnet as wn
+    table = SynsetNameTable(args.synset_table)
+    table.add_many((lemma.key(), synset.name()) for synset in wn.all_synsets() for lemma in synset.lemmas())
+    print("*** " + str(len(table)) + " sense keys saved in " + args.synset_table + " ***\n")
+    table.close()
+
+
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--synset_table', type=str, required=True,
+                        help="Path of the SQLite file to create.")
+    parser.set_defaults(func=build_synset_name_table)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Build the table with the synset name of each sense key.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("build_synset_name_table")
+    args.func(args)
@@ -0,0 +1,37 @@
+"""Convert a .csv corpus file (with the lists of picto ids and sense keys written as strings) into a .parquet file
+with real nested list columns, which can be read by `utils.read_corpus` without any parsing.
+
+Example of use:
+python convert_corpus_to_parquet.py --csv_file all.csv --parquet_file all.parquet
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+from utils import *
+from argparse import ArgumentParser, RawTextHelpFormatter
+
+
+def convert_corpus(args):
+    """Function to convert the .csv corpus file into a .parquet file."""
+    data = read_corpus(args.csv_file)
+    export_corpus_parquet(data, args.parquet_file)
+    print("*** " + str(len(data)) + " rows saved in " + args.parquet_file + " ***\n")
+
+
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--csv_file', type=str, required=True,
+                        help="Path of the .csv corpus file.")
+    parser.add_argument('--parquet_file', type=str, required=True,
+                        help="Path of the .parquet file to create.")
+    parser.set_defaults(func=convert_corpus)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Convert a .csv corpus file into a .parquet file.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("convert_corpus_to_parquet")
+    args.func(args)
@@ -6,13 +6,22 @@ Author
  * Cécile MACAIRE 2023
 """
 
-import ast
+import os
+import hashlib
+import sqlite3
+from itertools import repeat
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from utils import *
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
 from argparse import ArgumentParser, RawTextHelpFormatter
 
 
+# placeholder of the sentence id in the fragments, "\0" can not be in the text of an xml file
+SENTENCE_ID = "\0sentence_id\0"
+# version of the layout of the fragments, to change if `format_sentence` changes
+FRAGMENT_FORMAT = "1"
+
+
 class Word:
     """Class which defines a word with the corresponding information :
     surface_form, lemma, pos tag, sense key"""
@@ -25,38 +34,124 @@ class Word:
         self.id = id_word
 
 
-def create_xml_file():
+def escape_attribute(value):
     """
-        Function to create a xml file with the ET library.
+        Function to escape an attribute value the same way as `xml.dom.minidom`.
+
+        Arguments
+        ---------
+        value : str
+            Value of the attribute.
 
         Returns
         -------
-        root : `ET.element`
-            root of the ET element
+        The escaped value.
     """
-    root = ET.Element("corpus")
-    return root
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
 
 
-def create_doc_and_paragraph_in_xml(root, doc_name):
+def format_sentence(sentence_id, words, indent="   "):
     """
-        Function to create the structure of the xlm file.
+        Function to serialize a sentence and its words as a <sentence> fragment of the UFSAC file.
 
         Arguments
         ---------
-        root : ET.Element
-            Root of the xml file.
-        doc_name : str
-            Name of the document.
+        sentence_id : str
+            Id of the sentence.
+        words : list[Word]
+            Words of the sentence.
+        indent : str
+            Indentation used for one level of the xml file.
 
         Returns
         -------
-        The subElement "paragraph" of the xml file which will contain the sentences.
+        The <sentence> fragment, indented at the sentence level and ending with a new line.
     """
-    doc = ET.SubElement(root, "document")
-    doc.set("id", doc_name)
-    parag = ET.SubElement(doc, "paragraph")
-    return parag
+    prefix = indent * 3
+    if not words:
+        return prefix + '<sentence id="' + escape_attribute(sentence_id) + '"/>\n'
+    lines = [prefix + '<sentence id="' + escape_attribute(sentence_id) + '">\n']
+    for w in words:
+        word_els = [("surface_form", w.surface_form), ("lemma", w.lemma), ("pos", w.pos)]
+        if w.wn30_key:
+            word_els.extend([("wn30_key", w.wn30_key), ("id", w.id)])
+        attributes = ''.join(' ' + k + '="' + escape_attribute(v) + '"' for k, v in word_els)
+        lines.append(prefix + indent + '<word' + attributes + '/>\n')
+    lines.append(prefix + '</sentence>\n')
+    return ''.join(lines)
+
+
+class UFSACWriter:
+    """Class which writes a UFSAC xml file incrementally : each <document>, <sentence> and <word> is written
+    as soon as it is produced, with the same layout as `minidom.toprettyxml(indent="   ")`."""
+
+    def __init__(self, file, indent="   ", xml_declaration=True):
+        self.file = file
+        self.indent = indent
+        if xml_declaration:
+            self.file.write('<?xml version="1.0" ?>\n')
+        self.in_document = False
+        self.has_documents = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start_document(self, doc_name):
+        """
+            Function to open a <document> and its <paragraph>.
+
+            Arguments
+            ---------
+            doc_name : str
+                Name of the document.
+        """
+        if self.in_document:
+            self.end_document()
+        if not self.has_documents:
+            self.file.write('<corpus>\n')
+            self.has_documents = True
+        self.file.write(self.indent + '<document id="' + escape_attribute(doc_name) + '">\n')
+        self.file.write(self.indent * 2 + '<paragraph>\n')
+        self.in_document = True
+
+    def write_fragment(self, fragment):
+        """
+            Function to write an already serialized <sentence> fragment into the current document.
+
+            Arguments
+            ---------
+            fragment : str
+                Fragment generated by `format_sentence`.
+        """
+        self.file.write(fragment)
+
+    def write_sentence(self, sentence_id, words):
+        """
+            Function to write a sentence into the current document.
+
+            Arguments
+            ---------
+            sentence_id : str
+                Id of the sentence.
+            words : list[Word]
+                Words of the sentence.
+        """
+        self.write_fragment(format_sentence(sentence_id, words, self.indent))
+
+    def end_document(self):
+        """Function to close the current <paragraph> and <document>."""
+        self.file.write(self.indent * 2 + '</paragraph>\n')
+        self.file.write(self.indent + '</document>\n')
+        self.in_document = False
+
+    def close(self):
+        """Function to close the current document and the <corpus> root."""
+        if self.in_document:
+            self.end_document()
+        self.file.write('</corpus>\n' if self.has_documents else '<corpus/>\n')
 
 
 def linguistic_processing(sentence):
@@ -85,70 +180,330 @@ def linguistic_processing(sentence):
     return sentence
 
 
-def set_sentence_in_xml(parag, doc_name, index, row, spacy_model):
+def get_words_of_sentence(sentence_id, row, tokens):
     """
-        Function to add a sentence to the xml file with the word info.
+        Function to get the words of a sentence with their info.
 
         Arguments
         ---------
-        parag : ET.SubElement
-            Paragrah subElement of the xml file.
-        doc_name : str
-            Name of the doc of the xml.
-        index : int
-            Index of the sentence corresponding to the num sentence in the csv file.
+        sentence_id : str
+            Id of the sentence (name of the doc + ".s" + index of the sentence in the csv file).
         row : datarow
             Row of the dataframe which contains the info of the sentence.
-        spacy_model : spacy.lang.fr.French
-            Spacy model to tokenize, lemmatize the sentence.
+        tokens : list[tuple]
+            (text, lemma, pos) of each token of the sentence, from `annotate_sentences`.
+
+        Returns
+        -------
+        A list of `Word`.
     """
-    sent = ET.SubElement(parag, "sentence")
-    sent.set("id", doc_name + ".s" + str(index))
     words = []
-    doc = spacy_model(linguistic_processing(row["sentence"]))
-    sense_keys = ast.literal_eval(row['sense_keys'])
+    sense_keys = row['sense_keys']
     id_word = 1
-    for i, token in enumerate(doc):
-        w = Word(token.text, token.lemma_, token.pos_)
+    for i, (text, lemma, pos) in enumerate(tokens):
+        w = Word(text, lemma, pos)
         if sense_keys[i]:
             w.wn30_key = ';'.join(sense_keys[i])
-            w.id = doc_name + ".s" + str(index) + '.t' + str(id_word)
+            w.id = sentence_id + '.t' + str(id_word)
             id_word += 1
             words.append(w)
         else:
             words.append(w)
-    for w in words:
-        word = ET.SubElement(sent, "word")
-        word_els = {"surface_form": w.surface_form, "lemma": w.lemma, "pos": w.pos}
-        if w.wn30_key:
-            word_els["wn30_key"] = w.wn30_key
-            word_els["id"] = w.id
-        for k, v in word_els.items():
-            word.set(k, v)
+    return words
+
+
+def create_fragment_template(row, tokens):
+    """
+        Function to create the <sentence> fragment of a row, with a placeholder instead of the sentence id.
+
+        Arguments
+        ---------
+        row : datarow
+            Row of the dataframe which contains the info of the sentence.
+        tokens : list[tuple]
+            (text, lemma, pos) of each token of the sentence, from `annotate_sentences`.
+
+        Returns
+        -------
+        The fragment, to fill with `fill_fragment_template`.
+    """
+    return format_sentence(SENTENCE_ID, get_words_of_sentence(SENTENCE_ID, row, tokens))
+
+
+def fill_fragment_template(template, doc_name, index):
+    """
+        Function to put the id of the sentence in a fragment created by `create_fragment_template`.
+
+        Arguments
+        ---------
+        template : str
+            Fragment with the placeholder.
+        doc_name : str
+            Name of the doc of the xml.
+        index : int
+            Index of the sentence corresponding to the num sentence in the csv file.
+
+        Returns
+        -------
+        The <sentence> fragment to write in the xml file.
+    """
+    return template.replace(SENTENCE_ID, escape_attribute(doc_name + ".s" + str(index)))
+
+
+class FragmentStore:
+    """Class which stores on disk (SQLite) the <sentence> fragment generated for each row of the csv file.
+    A row is identified by a fingerprint of its sentence and sense keys (and of the spacy model), so only new or
+    changed rows have to be annotated again when the xml file is rebuilt."""
+
+    def __init__(self, path, model_name, model_version):
+        self.path = path
+        self.model_name = model_name
+        self.model_version = model_version
+        self.reused = 0
+        self.generated = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS fragments (fingerprint TEXT PRIMARY KEY, "
+                                "fragment TEXT NOT NULL)")
+        self.connection.commit()
+
+    def fingerprint(self, row):
+        """
+            Function to compute the fingerprint of a row.
+
+            Arguments
+            ---------
+            row : datarow
+                Row of the dataframe which contains the info of the sentence.
+
+            Returns
+            -------
+            The hexadecimal sha256 of the model, the sentence and the sense keys of the row.
+        """
+        content = '\0'.join([FRAGMENT_FORMAT, self.model_name, self.model_version, str(row["sentence"]),
+                              str(row["sense_keys"])])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get_many(self, rows):
+        """
+            Function to get the stored fragments of several rows.
 
+            Arguments
+            ---------
+            rows : list[datarow]
 
-def add_info_to_xml_file_per_doc(data_from_csv, root, spacy_model):
+            Returns
+            -------
+            A list with, for each row, its fragment template or None if the row is new or changed.
+        """
+        fingerprints = [self.fingerprint(r) for r in rows]
+        found = {}
+        for start in range(0, len(fingerprints), 500):
+            chunk = fingerprints[start:start + 500]
+            query = "SELECT fingerprint, fragment FROM fragments WHERE fingerprint IN (" + ','.join('?' * len(chunk)) \
+                    + ")"
+            found.update(self.connection.execute(query, chunk))
+        fragments = [found.get(f) for f in fingerprints]
+        generated = fragments.count(None)
+        self.generated += generated
+        self.reused += len(fragments) - generated
+        count("fragments_generated", generated)
+        count("fragments_reused", len(fragments) - generated)
+        return fragments
+
+    def put_many(self, rows, fragments):
+        """
+            Function to store the fragments of several rows.
+
+            Arguments
+            ---------
+            rows : list[datarow]
+            fragments : list[str]
+                Fragment template of each row.
+        """
+        self.connection.executemany("INSERT OR REPLACE INTO fragments (fingerprint, fragment) VALUES (?, ?)",
+                                    [(self.fingerprint(r), f) for r, f in zip(rows, fragments)])
+        self.connection.commit()
+
+    def report(self):
+        """Function to print the number of reused and generated fragments."""
+        print("*** Fragments " + self.path + " : " + str(self.reused) + " reused, " + str(self.generated)
+              + " generated ***\n")
+
+    def close(self):
+        self.connection.close()
+
+
+def iter_fragment_templates(rows, spacy_model, batch_size=32, n_process=1, cache=None, fragment_store=None,
+                            chunk_size=1000):
+    """
+        Function to get lazily the fragment template of each row, annotating only the rows not in the fragment store.
+        The rows are looked up in the fragment store by chunks, but the sentences of all the rows to annotate go
+        through a single `iter_annotations` stream (a single `nlp.pipe`), consumed across the chunks.
+
+        Arguments
+        ---------
+        rows : iterable[tuple]
+            (index, row) of the dataframe, as given by `iterrows`.
+        spacy_model : `spacy.lang` or str
+            Spacy model to use, or its name to load it only if needed.
+        batch_size : int
+            Number of sentences sent together to the model.
+        n_process : int
+            Number of worker processes used by spacy.
+        cache : AnnotationCache
+            Cache of the annotations.
+        fragment_store : FragmentStore
+            Store of the fragments of the previous runs, or None to generate all fragments.
+        chunk_size : int
+            Number of rows looked up and stored together in the fragment store.
+
+        Returns
+        -------
+        A generator of ((index, row), fragment template) in the order of the rows.
+    """
+    chunks = iter_chunks(rows, chunk_size)
+    # chunks looked up but not yet yielded : (chunk, templates, indexes of the rows to annotate)
+    pending = deque()
+    # sentences of the rows to annotate which are not yet read by the model
+    to_annotate = deque()
+
+    def lookup_next_chunk():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        if fragment_store:
+            templates = fragment_store.get_many([row for _, row in chunk])
+        else:
+            templates = [None] * len(chunk)
+        missing = [i for i, t in enumerate(templates) if t is None]
+        pending.append((chunk, templates, missing))
+        to_annotate.extend(linguistic_processing(chunk[i][1]["sentence"]) for i in missing)
+        return True
+
+    def sentences():
+        # the model reads ahead (a batch of sentences), the next chunks are looked up when it needs more sentences
+        while to_annotate or lookup_next_chunk():
+            if to_annotate:
+                yield to_annotate.popleft()
+
+    annotations = None
+    while pending or lookup_next_chunk():
+        chunk, templates, missing = pending.popleft()
+        if missing:
+            if annotations is None:
+                annotations = iter_annotations(sentences(), spacy_model, batch_size, n_process, cache, chunk_size)
+            for i in missing:
+                templates[i] = create_fragment_template(chunk[i][1], next(annotations))
+            if fragment_store:
+                fragment_store.put_many([chunk[i][1] for i in missing], [templates[i] for i in missing])
+        yield from zip(chunk, templates)
+
+
+def generate_document(doc_name, rows, spacy_model, batch_size=32, cache_path=None, fragment_store_path=None):
+    """
+        Function to generate the sentences of a document, run by the workers of `add_info_to_xml_file_per_doc`.
+        Each worker process loads its own spacy model (once) and opens its own connections to the stores.
+
+        Arguments
+        ---------
+        doc_name : str
+            Name of the document.
+        rows : list[tuple]
+            (index, row as a dict) of the sentences of the document.
+        spacy_model : str
+            Name of the spacy model to use.
+        batch_size : int
+            Number of sentences sent together to the model.
+        cache_path : str
+            Path of the annotation cache, or None.
+        fragment_store_path : str
+            Path of the fragment store, or None.
+
+        Returns
+        -------
+        A tuple with the <sentence> fragments of the document, a dict with the counters of the stores, and the
+        stages and counters of the run report of the worker for this document.
+    """
+    run_report.reset()
+    cache = load_annotation_cache(cache_path, spacy_model)
+    fragment_store = None
+    if fragment_store_path:
+        fragment_store = FragmentStore(fragment_store_path, spacy_model, get_model_version(spacy_model))
+    fragments = ''.join(fill_fragment_template(template, doc_name, index) for (index, row), template
+                        in iter_fragment_templates(rows, spacy_model, batch_size, 1, cache, fragment_store))
+    counters = {}
+    if cache:
+        counters.update(hits=cache.hits, misses=cache.misses)
+        cache.close()
+    if fragment_store:
+        counters.update(reused=fragment_store.reused, generated=fragment_store.generated)
+        fragment_store.close()
+    return fragments, counters, (run_report.stages, dict(run_report.counters))
+
+
+def add_info_to_xml_file_per_doc(data_from_csv, writer, spacy_model, batch_size=32, n_process=1, cache=None,
+                                 fragment_store=None, workers=1):
     """
         Function to read the data from csv file and create the xml file with the infos for all doc.
+        With several workers, the documents are generated in parallel by a pool of processes and written in the
+        same order as with one worker, so the xml file is identical. The stages and counters of the workers are added
+        to the run report (the time of a stage is then summed over the workers).
 
         Arguments
         ---------
         data_from_csv : dataframe
             Dataframe with the csv data.
-        root : ET.Element
-            Root of the xml file.
-        spacy_model : `spacy.lang`
-            Spacy model to use.
+        writer : UFSACWriter
+            Writer of the xml file.
+        spacy_model : `spacy.lang` or str
+            Spacy model to use, or its name to load it only if needed (a name is needed with several workers).
+        batch_size : int
+            Number of sentences sent together to the model.
+        n_process : int
+            Number of worker processes used by spacy.
+        cache : AnnotationCache
+            Cache of the annotations.
+        fragment_store : FragmentStore
+            Store of the fragments of the previous runs.
+        workers : int
+            Number of documents generated in parallel.
     """
-    by_doc = data_from_csv.groupby("doc_name")
-    for name, group in by_doc:
-        new_df = by_doc.get_group(name)
-        parag = create_doc_and_paragraph_in_xml(root, name)
-        for index, row in new_df.iterrows():
-            set_sentence_in_xml(parag, name, index, row, spacy_model)
+    if workers > 1:
+        # documents sorted by name, sentences kept in the csv order
+        names = []
+        rows_per_doc = []
+        for name, group in data_from_csv.groupby("doc_name"):
+            names.append(name)
+            rows_per_doc.append(list(zip(group.index.tolist(), group.to_dict('records'))))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(generate_document, names, rows_per_doc, repeat(spacy_model), repeat(batch_size),
+                                   repeat(cache.path if cache else None),
+                                   repeat(fragment_store.path if fragment_store else None))
+            for name, rows, (fragments, counters, report) in zip(names, rows_per_doc, results):
+                writer.start_document(name)
+                writer.write_fragment(fragments)
+                count("rows_written", len(rows))
+                run_report.merge(*report)
+                for store in [cache, fragment_store]:
+                    if store:
+                        for k, v in counters.items():
+                            if hasattr(store, k):
+                                setattr(store, k, getattr(store, k) + v)
+        return
+    # same order as a groupby on doc_name : documents sorted by name, sentences kept in the csv order
+    data_by_doc = data_from_csv[data_from_csv["doc_name"].notna()].sort_values("doc_name", kind="stable")
+    current_doc = None
+    for (index, row), template in iter_fragment_templates(data_by_doc.iterrows(), spacy_model, batch_size,
+                                                          n_process, cache, fragment_store):
+        if row["doc_name"] != current_doc:
+            current_doc = row["doc_name"]
+            writer.start_document(current_doc)
+        writer.write_fragment(fill_fragment_template(template, current_doc, index))
+        count("rows_written")
 
 
-def add_info_to_xml_file_per_doc_v2(data_from_csv, root, spacy_model):
+def add_info_to_xml_file_per_doc_v2(data_from_csv, writer, spacy_model, batch_size=32, n_process=1,
+                                    cache=None, fragment_store=None):
     """
         Function to read the data from csv file and create the xml file with the infos for 1 doc.
 
@@ -156,43 +511,77 @@ def add_info_to_xml_file_per_doc_v2(data_from_csv, root, spacy_model):
         ---------
         data_from_csv : dataframe
             Dataframe with the csv data.
-        root : ET.Element
-            Root of the xml file.
-        spacy_model : `spacy.lang`
-            Spacy model to use.
+        writer : UFSACWriter
+            Writer of the xml file.
+        spacy_model : `spacy.lang` or str
+            Spacy model to use, or its name to load it only if needed.
+        batch_size : int
+            Number of sentences sent together to the model.
+        n_process : int
+            Number of worker processes used by spacy.
+        cache : AnnotationCache
+            Cache of the annotations.
+        fragment_store : FragmentStore
+            Store of the fragments of the previous runs.
     """
     """Methode pour lire les données du csv récupérées des pdf annotés en pictos"""
-    parag = create_doc_and_paragraph_in_xml(root, "doc1")
-    for index, row in data_from_csv.iterrows():
-        print(index)
-        set_sentence_in_xml(parag, "doc1", index, row, spacy_model)
+    writer.start_document("doc1")
+    for (index, row), template in iter_fragment_templates(data_from_csv.iterrows(), spacy_model, batch_size,
+                                                          n_process, cache, fragment_store):
+        writer.write_fragment(fill_fragment_template(template, "doc1", index))
+        count("rows_written")
 
 
 def create_ufsac_file(args):
     """Function to create the UFSAC xml file for a csv data file.
-    It will create the xml file into the UFSAC format.
-    """
-    data_from_corpus = read_csv(args.csv_file)
-    xml_file = args.csv_file.split('.csv')[0] + '.xml'
-    root = create_xml_file()
-    spacy_model = load_spacy_model("fr_dep_news_trf")
-    if args.v1:
-        add_info_to_xml_file_per_doc(data_from_corpus, root, spacy_model)
-    else:
-        add_info_to_xml_file_per_doc_v2(data_from_corpus, root, spacy_model)
-    xmlstr = minidom.parseString(ET.tostring(root)).toprettyxml(indent="   ")
-    with open(args.output_path + xml_file, "w") as f:
-        f.write(xmlstr)
-
-
-parser = ArgumentParser(description="Create an .xml file in UFSAC format from a .csv data file.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--csv_file', type=str, required=True,
-                    help="Path of the .csv data file.")
-parser.add_argument('--output_path', type=str, required=True,
-                    help="Path to store the .xml file.")
-parser.add_argument('--v1', type=bool, required=True,
-                    help="Version to create an .xml file for all the documents.")
-parser.set_defaults(func=create_ufsac_file)
-args = parser.parse_args()
-args.func(args)
+    It will create the xml file into the UFSAC format, written incrementally.
+    With a fragment store, only the rows which are new or changed since the last run are annotated.
+    """
+    data_from_corpus = read_corpus(args.csv_file)
+    xml_file = os.path.splitext(args.csv_file)[0] + '.xml'
+    spacy_model = "fr_dep_news_trf"
+    cache = load_annotation_cache(args.nlp_cache, spacy_model)
+    fragment_store = None
+    if args.fragment_store:
+        fragment_store = FragmentStore(args.fragment_store, spacy_model, get_model_version(spacy_model))
+    with stage("write xml"), open(args.output_path + xml_file, "w") as f, UFSACWriter(f) as writer:
+        if args.v1:
+            add_info_to_xml_file_per_doc(data_from_corpus, writer, spacy_model, args.batch_size, args.n_process,
+                                         cache, fragment_store, args.workers)
+        else:
+            add_info_to_xml_file_per_doc_v2(data_from_corpus, writer, spacy_model, args.batch_size,
+                                            args.n_process, cache, fragment_store)
+    for store in [cache, fragment_store]:
+        if store:
+            store.report()
+            store.close()
+
+
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--csv_file', type=str, required=True,
+                        help="Path of the .csv (or .parquet) data file.")
+    parser.add_argument('--output_path', type=str, required=True,
+                        help="Path to store the .xml file.")
+    parser.add_argument('--v1', type=bool, required=True,
+                        help="Version to create an .xml file for all the documents.")
+    parser.add_argument('--batch_size', type=int, default=32,
+                        help="Number of sentences annotated together by the spacy model.")
+    parser.add_argument('--n_process', type=int, default=1,
+                        help="Number of processes used by the spacy model.")
+    parser.add_argument('--nlp_cache', type=str, default=None,
+                        help="Path of the SQLite file used to cache the annotations of the spacy model.")
+    parser.add_argument('--fragment_store', type=str, default=None,
+                        help="Path of the SQLite file storing the fragment of each row, to only rebuild changed rows.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of documents generated in parallel (each worker loads the spacy model).")
+    parser.set_defaults(func=create_ufsac_file)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Create an .xml file in UFSAC format from a .csv data file.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("convert_csv_to_UFSAC_format")
+    args.func(args)
@@ -0,0 +1,128 @@
+"""Single command line interface for all the scripts creating and processing the picto corpora.
+Each subcommand runs one script, and only the modules of this script (and their dependencies, e.g. spacy or stanza)
+are imported, so a subcommand starts as fast as its own dependencies allow.
+
+Example of use:
+python corpora_s2p.py convert-ufsac --csv_file all.csv --output_path ./ --v1 True
+python corpora_s2p.py --time-startup platform-jsons --arasaac_jsons ./arasaac_jsons/ --wolf_data ./arasaac.fr.csv
+--data_wn31 index.sense --all
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import time
+
+start_time = time.perf_counter()
+
+import sys
+import importlib
+from argparse import ArgumentParser, RawTextHelpFormatter, REMAINDER
+
+# name of the subcommand : (module of the script, description)
+COMMANDS = {
+    "convert-ufsac": ("convert_csv_to_UFSAC_format",
+                      "Create an .xml file in UFSAC format from a .csv data file."),
+    "convert-parquet": ("convert_corpus_to_parquet",
+                        "Convert a .csv corpus file into a .parquet file."),
+    "build-synset-table": ("build_synset_name_table",
+                           "Build the table with the synset name of each sense key."),
+    "corpus-eval-magali": ("create_corpus_from_eval_magali",
+                           "Create a .csv file from source and reference .txt files."),
+    "corpus-polysemous": ("create_corpus_polysemous_magali",
+                          "Generate a .csv file from the polysemous data in the correct format."),
+    "corpus-s2p": ("create_corpus_s2p",
+                   "Create a .csv file from recorded files of LitDevTools."),
+    "platform-jsons": ("create_json_files_for_InteraactionPicto_platforms",
+                       "Create different json files for InteraactionPicto platforms."),
+    "unige-json": ("create_json_unige_platform",
+                   "Generate the json file for LitDevTool platform."),
+    "stats": ("generate_stats_corpus_s2p",
+              "Extract the info from corpus and generate stats."),
+    "download-images": ("get_all_pictos_arasaac_and_download_images",
+                        "Download picto images from arasaac."),
+    "picto-jsons": ("get_json_and_keywords_from_arasaac_id_pictos",
+                    "Create a .csv file with each id picto linked to their keywords, and saved all json from arasaac."),
+    "sense-keys": ("get_sense_keys",
+                   "Add sense keys to corpus file with sentences and picto ids."),
+    "lemmas-to-pictos": ("sentences_to_lemmas_and_picto_ids",
+                         "From sentences, get the lemmas and possible linked picto ids."),
+    "annotation-server": ("annotation_server",
+                          "Run a server which keeps the annotation models loaded."),
+}
+
+# dependencies which take time to import, reported by --time-startup
+HEAVY_MODULES = ['numpy', 'pandas', 'pyarrow', 'spacy', 'stanza', 'nltk', 'matplotlib', 'seaborn', 'aiohttp']
+
+
+def build_parser():
+    """
+        Function to create the parser of the main command, the arguments of the subcommand are parsed later.
+
+        Returns
+        -------
+        The `ArgumentParser` of the main command.
+    """
+    parser = ArgumentParser(prog="corpora_s2p", description="Create and process the picto corpora.",
+                            formatter_class=RawTextHelpFormatter,
+                            epilog="Subcommands:\n" + '\n'.join("  " + name.ljust(20) + description
+                                                                for name, (_, description) in COMMANDS.items()))
+    parser.add_argument('--time-startup', action='store_true',
+                        help="Print the time taken to import the modules of the subcommand.")
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command',
+                        help="Subcommand to run (see below).")
+    parser.add_argument('arguments', nargs=REMAINDER,
+                        help="Arguments of the subcommand (use 'corpora_s2p <command> -h' to list them).")
+    return parser
+
+
+def report_startup(command, timings):
+    """
+        Function to print the time taken by each step of the startup, and the heavy modules imported.
+
+        Arguments
+        ---------
+        command : str
+            Name of the subcommand.
+        timings : dict
+            Time (in seconds) of each step of the startup.
+    """
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    print("*** Startup of " + command + " : "
+          + ', '.join(step + " " + str(round(seconds * 1000, 1)) + " ms" for step, seconds in timings.items())
+          + " ***", file=sys.stderr)
+    print("*** Heavy modules imported : " + (', '.join(loaded) if loaded else "none") + " ***\n", file=sys.stderr)
+
+
+def main(argv=None):
+    """
+        Function to run a subcommand.
+
+        Arguments
+        ---------
+        argv : list[str]
+            Arguments of the command line, sys.argv[1:] if None.
+    """
+    args = build_parser().parse_args(argv)
+    timings = {"corpora_s2p": time.perf_counter() - start_time}
+    module_name, description = COMMANDS[args.command]
+    step_start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    timings["import " + module_name] = time.perf_counter() - step_start
+    step_start = time.perf_counter()
+    parser = module.build_parser(ArgumentParser(prog="corpora_s2p " + args.command, description=description,
+                                                formatter_class=RawTextHelpFormatter))
+    command_args = parser.parse_args(args.arguments)
+    timings["arguments"] = time.perf_counter() - step_start
+    if args.time_startup:
+        report_startup(args.command, timings)
+    # every script imports utils, so it is already loaded at this point
+    from utils import enable_run_report
+    report = enable_run_report(args.command)
+    for step, seconds in timings.items():
+        report.add_stage("startup " + step, seconds)
+    command_args.func(command_args)
+
+
+if __name__ == "__main__":
+    main()
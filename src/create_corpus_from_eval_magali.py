@@ -26,24 +26,6 @@ from argparse import ArgumentParser, RawTextHelpFormatter
 from utils import *
 
 
-def read_tsv_file(tsv_file):
-    """
-        Function to read the data into a dataframe from arasaac.fre30bis.
-
-        Arguments
-        ---------
-        tsv_file : str
-            Path of the .tsv file.
-
-        Returns
-        -------
-        A pandas dataframe with the data.
-    """
-    data = pd.read_csv(tsv_file, sep=',')
-    data["synset2"] = data["synset2"].replace("\\N", "0")
-    return data
-
-
 def read_txt_file(txt_file):
     """
         Function to read the .txt file with the annotated data.
@@ -103,7 +85,7 @@ def read_source_ref_txt_file(source_file, ref_file):
     return source_content, ref_content
 
 
-def get_picto_and_synsets_from_ref_content_sentence(ref_sentence, data_wn31, data_arasaac):
+def get_picto_and_synsets_from_ref_content_sentence(ref_sentence, data_wn31, lemma_index):
     """
         Function to get the corresponding picto ids and sense keys from reference sentence lemmas.
 
@@ -111,10 +93,10 @@ def get_picto_and_synsets_from_ref_content_sentence(ref_sentence, data_wn31, dat
         ---------
         ref_sentence : str
             Reference sentence.
-        data_wn31 : dataframe
-            Dataframe with the WordNet 3.1 infos.
-        data_arasaac : dataframe
-            Dataframe with the arasaac.fre30 infos.
+        data_wn31 : WordNetSenseIndex
+            Index with the WordNet 3.1 infos.
+        lemma_index : dict
+            Index of the arasaac.fre30 infos by lemma, built with `build_lemma_index`.
 
         Returns
         -------
@@ -124,11 +106,10 @@ def get_picto_and_synsets_from_ref_content_sentence(ref_sentence, data_wn31, dat
     senses_per_pictos = []
     lemmas_picto = ref_sentence.split(" ")
     for l in lemmas_picto:
-        ids_picto.append(list(set(data_arasaac.loc[data_arasaac["lemma"] == l]["idpicto"].tolist())))
-        synset = data_arasaac.loc[data_arasaac["lemma"] == l]["synset2"].tolist()
+        ids, synset = lemma_index.get(l, ((), []))
+        ids_picto.append(list(ids))
         senses = list(
-            set([element for sous_liste in [get_sense_key_from_synset_2(s, data_wn31) for s in synset] for element in
-                 sous_liste]))
+            set([element for sous_liste in data_wn31.lookup_many(synset) for element in sous_liste]))
         senses_per_pictos.append(senses)
     return ids_picto, senses_per_pictos
 
@@ -145,16 +126,17 @@ def get_id_picto_and_senses_corpus(source_content, ref_content, data_arasaac, da
             Reference sentence.
         data_arasaac : dataframe
             Dataframe with the arasaac.fre30 infos.
-        data_wn31 : dataframe
-            Dataframe with the WordNet 3.1 infos.
+        data_wn31 : WordNetSenseIndex
+            Index with the WordNet 3.1 infos.
 
         Returns
         -------
         Return a dict with, for each source sentence, the id pictos and sense key(s) of each lemma.
     """
+    lemma_index = build_lemma_index(data_arasaac)
     infos = {}
     for i, s in enumerate(ref_content):
-        id_pictos, senses = get_picto_and_synsets_from_ref_content_sentence(s, data_wn31, data_arasaac)
+        id_pictos, senses = get_picto_and_synsets_from_ref_content_sentence(s, data_wn31, lemma_index)
         infos[source_content[i]] = [id_pictos, senses]
     return infos
 
@@ -185,7 +167,7 @@ def create_corpus(args):
         It will create a .csv file with the corresponding information.
     """
     source_content, ref_content = read_source_ref_txt_file(args.source_file, args.ref_file)
-    data_wn31 = parse_wn31_file(args.data_wn31)
+    data_wn31 = load_wn31_index(args.data_wn31)
     data_arasaac = read_tsv_file(args.data_arasaac)
 
     corpus = get_id_picto_and_senses_corpus(source_content, ref_content, data_arasaac, data_wn31)
@@ -193,18 +175,25 @@ def create_corpus(args):
     create_csv_file_from_infos(corpus, args.name_csv)
 
 
-parser = ArgumentParser(description="Create a .csv file from source and reference .txt files.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--source_file', type=str, required=True,
-                    help="Path of the source file.")
-parser.add_argument('--ref_file', type=str, required=True,
-                    help="Path of the reference file.")
-parser.add_argument('--data_arasaac', type=str, required=True,
-                    help="Path of the arasaac.fre30bis.csv file.")
-parser.add_argument('--data_wn31', type=str, required=True,
-                    help="Path of index.sense file.")
-parser.add_argument('--name_csv', type=str, required=True,
-                    help="name of the output .csv file.")
-parser.set_defaults(func=create_corpus)
-args = parser.parse_args()
-args.func(args)
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--source_file', type=str, required=True,
+                        help="Path of the source file.")
+    parser.add_argument('--ref_file', type=str, required=True,
+                        help="Path of the reference file.")
+    parser.add_argument('--data_arasaac', type=str, required=True,
+                        help="Path of the arasaac.fre30bis.csv file.")
+    parser.add_argument('--data_wn31', type=str, required=True,
+                        help="Path of index.sense file.")
+    parser.add_argument('--name_csv', type=str, required=True,
+                        help="name of the output .csv file.")
+    parser.set_defaults(func=create_corpus)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Create a .csv file from source and reference .txt files.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("create_corpus_from_eval_magali")
+    args.func(args)
@@ -12,21 +12,21 @@ from argparse import ArgumentParser, RawTextHelpFormatter
 from utils import *
 
 
-def create_data_for_sentence(picto_table, wn_table, model, sentence, wolf_senses, picto_id, word_to_wsd, sentences,
+def create_data_for_sentence(picto_table, wn_table, tokens, sentence, wolf_senses, picto_id, word_to_wsd, sentences,
                              sentences_in_picto, sentences_in_senses):
     """
         Function to get the sentences in picto and in sense keys.
 
         Arguments
         ---------
-        picto_table : dataframe
-            Data with the arasaac picto information.
-        wn_table : dataframe
-            Data from WordNet 3.1 data.
-        model : `spacy.lang.fr`
-            Spacy model used.
+        picto_table : dict
+            Index of the arasaac picto information by wolf synset, built with `build_wolf_synset_index`.
+        wn_table : WordNetSenseIndex
+            Index with the WordNet 3.1 infos.
+        tokens : list[tuple]
+            (text, lemma, pos) of each token of the sentence, from `annotate_sentences`.
         sentence : str
-            Sentence to process with spacy.
+            Sentence processed with spacy.
         wolf_senses : str
             Synset from the data.
         picto_id : str
@@ -49,15 +49,13 @@ def create_data_for_sentence(picto_table, wn_table, model, sentence, wolf_senses
     for w_sense in wolf_senses:
         all_sense_keys.extend(get_sense_keys_from_synset_wolf(wn_table, picto_table, w_sense))
 
-    doc = model(sentence)
-
     sentence_in_picto = []
     sentence_in_senses = []
 
-    for token in doc:
-        if token.lemma_ != " " and token.lemma_ != "'":
-            print("Lemma : ", token.lemma_)
-            if word_to_wsd == token.lemma_:
+    for text, lemma, pos in tokens:
+        if lemma != " " and lemma != "'":
+            print("Lemma : ", lemma)
+            if word_to_wsd == lemma:
                 sentence_in_picto.append(ast.literal_eval(picto_id))
                 sentence_in_senses.append(all_sense_keys)
             else:
@@ -69,60 +67,76 @@ def create_data_for_sentence(picto_table, wn_table, model, sentence, wolf_senses
     sentences_in_senses.append(sentence_in_senses)
 
 
+def get_sentences_to_process(corpus_magali):
+    """
+        Function to get all the sentences of the polysemous data with the info of their row.
+
+        Arguments
+        ---------
+        corpus_magali : dataframe
+            Data from polysemous.csv.
+
+        Returns
+        -------
+        A list of (sentence, wolf sense, picto id, word to disambiguate) tuples.
+    """
+    import pandas as pd
+    to_process = []
+    for index, row in corpus_magali.iterrows():
+        for column in ["sentence1", "sentence2", "sentence3", "sentence4", "sentence5", "sentence6"]:
+            if column == "sentence1" or not pd.isna(row[column]):
+                to_process.append((row[column], row["sense_wolf_correct"], row["sense1_pictoID_correct_arasaac"],
+                                   row["wordToDisambiguate"]))
+    return to_process
+
+
 def create_data(args):
+    import pandas as pd
     corpus_magali = pd.read_csv(args.csv_file, sep='\t')
 
-    nlp = load_spacy_model("fr_dep_news_trf")
-    picto_table = load_picto_table(args.data_arasaac)
-    wn_table = parse_wn31_file(args.data_wn31)
+    spacy_model = "fr_dep_news_trf"
+    cache = load_annotation_cache(args.nlp_cache, spacy_model)
+    picto_table = build_wolf_synset_index(load_picto_table(args.data_arasaac))
+    wn_table = load_wn31_index(args.data_wn31)
 
     sentences = []
     sentences_in_picto = []
     sentences_in_senses = []
 
-    for index, row in corpus_magali.iterrows():
-        word_to_disambiguate = row["wordToDisambiguate"]
-        sentence = row["sentence1"]
-        picto_id = row["sense1_pictoID_correct_arasaac"]
-        wolf_sense = row["sense_wolf_correct"]
-        create_data_for_sentence(picto_table, wn_table, nlp, sentence, wolf_sense, picto_id, word_to_disambiguate,
+    to_process = get_sentences_to_process(corpus_magali)
+    annotations = iter_annotations([p[0] for p in to_process], spacy_model, cache=cache)
+    for (sentence, wolf_sense, picto_id, word_to_disambiguate), tokens in zip(to_process, annotations):
+        create_data_for_sentence(picto_table, wn_table, tokens, sentence, wolf_sense, picto_id, word_to_disambiguate,
                                  sentences, sentences_in_picto, sentences_in_senses)
-        if not pd.isna(row["sentence2"]):
-            sentence2 = row["sentence2"]
-            create_data_for_sentence(picto_table, wn_table, nlp, sentence2, wolf_sense, picto_id, word_to_disambiguate,
-                                     sentences, sentences_in_picto, sentences_in_senses)
-        if not pd.isna(row["sentence3"]):
-            sentence3 = row["sentence3"]
-            create_data_for_sentence(picto_table, wn_table, nlp, sentence3, wolf_sense, picto_id, word_to_disambiguate,
-                                     sentences, sentences_in_picto, sentences_in_senses)
-        if not pd.isna(row["sentence4"]):
-            sentence4 = row["sentence4"]
-            create_data_for_sentence(picto_table, wn_table, nlp, sentence4, wolf_sense, picto_id, word_to_disambiguate,
-                                     sentences, sentences_in_picto, sentences_in_senses)
-        if not pd.isna(row["sentence5"]):
-            sentence5 = row["sentence5"]
-            create_data_for_sentence(picto_table, wn_table, nlp, sentence5, wolf_sense, picto_id, word_to_disambiguate,
-                                     sentences, sentences_in_picto, sentences_in_senses)
-        if not pd.isna(row["sentence6"]):
-            sentence6 = row["sentence6"]
-            create_data_for_sentence(picto_table, wn_table, nlp, sentence6, wolf_sense, picto_id, word_to_disambiguate,
-                                     sentences, sentences_in_picto, sentences_in_senses)
+    if cache:
+        cache.report()
+        cache.close()
 
     data = {'sentence': sentences, 'pictos_ref_ids': sentences_in_picto, 'sense_keys': sentences_in_senses}
     dataframe = pd.DataFrame.from_dict(data)
     dataframe.to_csv(args.outfile, index=False, sep='\t')
 
 
-parser = ArgumentParser(description="Generate a .csv file from the polysemous data in the correct format.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--csv_file', type=str, required=True,
-                    help="Path of the polysemous.csv file.")
-parser.add_argument('--data_arasaac', type=str, required=True,
-                    help="Path of the arasaac.fre30bis.csv file.")
-parser.add_argument('--data_wn31', type=str, required=True,
-                    help="Path of index.sense file.")
-parser.add_argument('--outfile', type=str, required=True,
-                    help="Path to store the generated .csv file.")
-parser.set_defaults(func=create_data)
-args = parser.parse_args()
-args.func(args)
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--csv_file', type=str, required=True,
+                        help="Path of the polysemous.csv file.")
+    parser.add_argument('--data_arasaac', type=str, required=True,
+                        help="Path of the arasaac.fre30bis.csv file.")
+    parser.add_argument('--data_wn31', type=str, required=True,
+                        help="Path of index.sense file.")
+    parser.add_argument('--outfile', type=str, required=True,
+                        help="Path to store the generated .csv file.")
+    parser.add_argument('--nlp_cache', type=str, default=None,
+                        help="Path of the SQLite file used to cache the annotations of the spacy model.")
+    parser.set_defaults(func=create_data)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(
+        description="Generate a .csv file from the polysemous data in the correct format.",
+        formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("create_corpus_polysemous_magali")
+    args.func(args)
@@ -11,8 +11,8 @@ Author
 
 from utils import *
 import os
-import pandas as pd
 import json
+from concurrent.futures import ThreadPoolExecutor
 from argparse import ArgumentParser, RawTextHelpFormatter
 
 
@@ -29,7 +29,8 @@ def get_name_speakers(path_recordings):
         -------
         A list with the name of each speaker.
     """
-    return next(os.walk(path_recordings))[1]
+    with os.scandir(path_recordings) as entries:
+        return [entry.name for entry in entries if entry.is_dir()]
 
 
 def get_info_in_json(path_recordings, name_speaker):
@@ -51,22 +52,64 @@ def get_info_in_json(path_recordings, name_speaker):
         return json.load(f)
 
 
-def align_data(corpus_data, sentence):
+def get_info_of_all_speakers(path_recordings, speakers, max_workers=16):
     """
-        Function to get the info of the recorded sentence from the dataframe.
+        Function to read in parallel the json files of all the speakers.
+
+        Arguments
+        ---------
+        path_recordings : str
+            Path of the folder where the recordings are stored.
+        speakers : list[str]
+            Name of the speakers.
+        max_workers : int
+            Number of files read in parallel.
+
+        Returns
+        -------
+        A list with the json data of each speaker, in the same order as the speakers.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda speaker: get_info_in_json(path_recordings, speaker), speakers))
+
+
+def index_corpus_by_sentence(corpus_data):
+    """
+        Function to index the rows of the corpus by sentence.
 
         Arguments
         ---------
         corpus_data : dataframe
             Dataframe which contains the info in each sentence (picto ids, etc.).
+
+        Returns
+        -------
+        A dict with, for each sentence, the list of the rows (as dicts) with this sentence.
+    """
+    index = {}
+    for record in corpus_data.to_dict('records'):
+        index.setdefault(record["sentence"], []).append(record)
+    return index
+
+
+def align_data(corpus_index, sentence):
+    """
+        Function to get the info of the recorded sentence from the corpus.
+
+        Arguments
+        ---------
+        corpus_index : dict
+            Rows of the corpus per sentence, from `index_corpus_by_sentence`.
         sentence : str
             Sentence from the json file.
 
         Returns
         -------
-        A dict with the info from the dataframe corresponding to the searched sentence.
+        A dict with the info from the dataframe corresponding to the searched sentence (the first one if the sentence
+        is several times in the corpus), None if the sentence is not in the corpus.
     """
-    return corpus_data.loc[corpus_data["sentence"] == sentence].to_dict('records')[0]
+    records = corpus_index.get(sentence)
+    return records[0] if records else None
 
 
 def create_data_corpus_s2p(args):
@@ -74,13 +117,21 @@ def create_data_corpus_s2p(args):
     Function to create the corpus with the name of the recorded file + speaker + the info from the recorded sentence.
     A .csv file is created with the name of the recorded file + speaker info + info of the recorded sentence.
     """
+    import pandas as pd
     data = {'path': [], 'speaker': [], 'speaker_id': [], 'doc_name': [], 'sentence': [], 'pictos_ref_ids': [],
             'sense_keys': []}
-    corpus_data = read_csv(args.path_data)
-    for i, speak in enumerate(get_name_speakers(args.path_recordings)):
-        json_data = get_info_in_json(args.path_recordings, speak)
+    corpus_index = index_corpus_by_sentence(read_csv(args.path_data))
+    unmatched = []
+    ambiguous = set()
+    speakers = get_name_speakers(args.path_recordings)
+    for i, (speak, json_data) in enumerate(zip(speakers, get_info_of_all_speakers(args.path_recordings, speakers))):
         for sent in json_data:
-            request = align_data(corpus_data, sent['text'])
+            request = align_data(corpus_index, sent['text'])
+            if request is None:
+                unmatched.append((speak, sent["file"], sent["text"]))
+                continue
+            if len(corpus_index[sent['text']]) > 1:
+                ambiguous.add(sent['text'])
             data['path'].append(sent["file"])
             data['speaker'].append(speak)
             data['speaker_id'].append(str(i + 1))
@@ -90,16 +141,29 @@ def create_data_corpus_s2p(args):
             data["sense_keys"].append(request["sense_keys"])
     df = pd.DataFrame(data)
     df.to_csv(args.output, index=False, sep='\t')
-
-
-parser = ArgumentParser(description="Create a .csv file from recorded files of LitDevTools.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--path_recordings', type=str, required=True,
-                    help="Path of the folder with the recorded files.")
-parser.add_argument('--path_data', type=str, required=True,
-                    help="Path of the .csv data with info for each sentence recorded.")
-parser.add_argument('--output', type=str, required=True,
-                    help="Path of the output .csv file generated.")
-parser.set_defaults(func=create_data_corpus_s2p)
-args = parser.parse_args()
-args.func(args)
+    print("*** " + str(len(df)) + " recordings aligned, " + str(len(unmatched)) + " unmatched, "
+          + str(len(ambiguous)) + " ambiguous sentences ***\n")
+    for speak, file, text in unmatched:
+        print("Unmatched : " + speak + " " + file + " : " + text)
+    for text in sorted(ambiguous):
+        print("Ambiguous (first row used) : " + text)
+
+
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--path_recordings', type=str, required=True,
+                        help="Path of the folder with the recorded files.")
+    parser.add_argument('--path_data', type=str, required=True,
+                        help="Path of the .csv data with info for each sentence recorded.")
+    parser.add_argument('--output', type=str, required=True,
+                        help="Path of the output .csv file generated.")
+    parser.set_defaults(func=create_data_corpus_s2p)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Create a .csv file from recorded files of LitDevTools.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("create_corpus_s2p")
+    args.func(args)
@@ -6,6 +6,9 @@
 
 Example of use: python create_json_files_for_InteraactionPicto_platforms.py --arasaac_jsons ./arasaac_jsons/
 --wolf_data ./arasaac.fr.csv --data_wn31 index.sense --type 1
+(or --all instead of --type to generate the 4 files at once)
+(with --synset_table synset_names.sqlite, the synset names are read from the table built by
+build_synset_name_table.py instead of NLTK WordNet)
 
 Author
  * Cécile MACAIRE 2023
@@ -13,11 +16,16 @@ Author
 
 import json
 from os import listdir
+from concurrent.futures import ProcessPoolExecutor
 from os.path import isfile, join
-from nltk.corpus import wordnet as wn
 from utils import *
 from argparse import ArgumentParser, RawTextHelpFormatter
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 
 def get_json_from_directory(path_picto_ids):
     """
@@ -48,13 +56,38 @@ def get_data_from_wolf(wolf_data):
         -------
         A dataframe with the wanted information.
     """
+    import pandas as pd
     df = pd.read_csv(wolf_data, delimiter=',')
     picto_table = df[['lemma', 'synset2', "lemma_plural"]]
     # picto_table.loc[:, 'synset2_proc'] = picto_table['synset2'].apply(lambda a: a.split('-')[0])
     return picto_table
 
 
-def get_lemma_from_wolf_and_corresponding_synsets(picto_table, data_wn31):
+def get_synset_name(sense, synset_table=None):
+    """
+        Function to get the name of the wordnet synset of a sense key.
+
+        Arguments
+        ---------
+        sense : str
+            Sense key.
+        synset_table : SynsetNameTable
+            Table of the synset names, or None to use NLTK WordNet (loaded at the first call).
+
+        Returns
+        -------
+        The synset name, None if not found.
+    """
+    if synset_table is not None:
+        return synset_table.lookup(sense)
+    from nltk.corpus import wordnet as wn
+    try:
+        return wn.synset_from_sense_key(sense).name()
+    except Exception:
+        return None
+
+
+def get_lemma_from_wolf_and_corresponding_synsets(picto_table, data_wn31, synset_table=None):
     """
         Function to get the lemma and the corresponding sense keys from arasaac.fr table.
 
@@ -62,8 +95,10 @@ def get_lemma_from_wolf_and_corresponding_synsets(picto_table, data_wn31):
         ---------
         picto_table : dataframe
             Dataframe with the info of arasaac pictos.
-        data_wn31 : dataframe
-            Dataframe with the info of wordnet3.1.
+        data_wn31 : WordNetSenseIndex
+            Index with the WordNet 3.1 infos.
+        synset_table : SynsetNameTable
+            Table of the synset names, or None to use NLTK WordNet.
 
         Returns
         -------
@@ -84,23 +119,13 @@ def get_lemma_from_wolf_and_corresponding_synsets(picto_table, data_wn31):
             plural = ' '.join(row["lemma_plural"].split('_'))
         sense_keys = get_sense_key_from_synset(row["synset2"], data_wn31)
         for sense in sense_keys:
-            try:
-                synset = wn.synset_from_sense_key(sense).name()
-                for word in [lemma, plural]:
-                    if word != '':
-                        results.setdefault(word, []).append(synset)
-                # if lemma != '':
-                #     if lemma not in results.keys():
-                #         results[lemma] = [synset]
-                #     else:
-                #         results[lemma].append(synset)
-                # if plural != '':
-                #     if plural not in results.keys():
-                #         results[plural] = [synset]
-                #     else:
-                #         results[plural].append(synset)
-            except Exception as e:
-                print("No synset found for ", e)
+            synset = get_synset_name(sense, synset_table)
+            if synset is None:
+                print("No synset found for ", sense)
+                continue
+            for word in [lemma, plural]:
+                if word != '':
+                    results.setdefault(word, []).append(synset)
     return results
 
 
@@ -111,140 +136,196 @@ def get_sense_key_from_synset(synset, data_wn31):
         Arguments
         ---------
         synset : str
-        data_wn31 : dataframe
-            Dataframe with the info of wordnet3.1.
+        data_wn31 : WordNetSenseIndex
+            Index with the WordNet 3.1 infos.
 
         Returns
         -------
         A list with sense key(s) or empty string.
     """
     if synset not in ["", r"\N", 'None', 'closed']:
-        synset_to_search = synset.split("-")[0]
-        rows_with_synset = data_wn31.loc[data_wn31['synset'] == int(synset_to_search)]
-        sense_keys = rows_with_synset["sense_key"].tolist()
-        return sense_keys
+        return data_wn31.lookup(synset)
     else:
         return [""]
 
 
-def get_data_from_picto(file, saved_data: dict):
+def read_picto_json(file):
     """
-        Function to get the keywords with corresponding picto ids from json file.
+        Function to read the json file of an arasaac picto (with orjson if installed).
 
         Arguments
         ---------
         file : str
             Json file with the info of an arasaac picto.
-        saved_data : dict
-            Dict with, for each keyword, the corresponding picto id.
+
+        Returns
+        -------
+        The json info of the picto.
     """
-    with open(file, 'r') as f:
-        data = json.load(f)
-    _id = data['_id']
-    keywords = []
-    if "keyword" in data["keywords"].__str__():
-        for keyword in data['keywords']:
-            keywords.append(keyword['keyword'])
-            if "plural" in keyword:
-                keywords.append(keyword['plural'])
-    for key in keywords:
-        if key not in saved_data.keys():
-            saved_data[key] = [_id]
-        else:
-            saved_data[key].append(_id)
+    with open(file, 'rb') as f:
+        return json_loads(f.read())
 
 
-def get_data_synsets_from_picto(file, data_wn31, saved_data: dict):
+def get_data_from_picto(data, keywords_data: dict, synsets_data: dict):
     """
-        Function to get the corresponding sense key(s) from a synset in json file.
+        Function to get the keywords and the arasaac synsets with corresponding picto id from the info of a picto.
 
         Arguments
         ---------
-        file : str
-            Json file with the info of an arasaac picto.
-        data_wn31 : dataframe
-            Dataframe with the info of wordnet3.1.
-        saved_data : dict
-            Dict with, for each sense key, the corresponding picto id.
+        data : dict
+            Json info of an arasaac picto.
+        keywords_data : dict
+            Dict with, for each keyword, the set of corresponding picto ids.
+        synsets_data : dict
+            Dict with, for each arasaac synset, the set of corresponding picto ids.
     """
-    with open(file, 'r') as f:
-        data = json.load(f)
     _id = data['_id']
-    synsets = data["synsets"]
-    for s in synsets:
+    for keyword in data.get('keywords', []):
+        for key in ['keyword', 'plural']:
+            if key in keyword:
+                keywords_data.setdefault(keyword[key], set()).add(_id)
+    for s in data.get('synsets', []):
         if s != "closed":
-            sense_keys = get_sense_key_from_synset(s, data_wn31)
-            for sense in sense_keys:
-                try:
-                    synset = wn.synset_from_sense_key(sense).name()
-                    if synset not in saved_data.keys():
-                        saved_data[synset] = [_id]
-                    else:
-                        saved_data[synset].append(_id)
-                except Exception as e:
-                    print("No synset found for ", e)
+            synsets_data.setdefault(s, set()).add(_id)
 
 
-def create_json_file_with_keywords_and_pictos(path_picto_ids):
+def parse_picto_files(files):
     """
-        Function to create the names.json file.
+        Function to parse a chunk of arasaac json files, run by the workers of `ingest_picto_files`.
+
+        Arguments
+        ---------
+        files : list[str]
+            Json files with the info of arasaac pictos.
+
+        Returns
+        -------
+        A tuple with the keyword -> picto ids and the arasaac synset -> picto ids dicts of the chunk.
+    """
+    keywords_data = {}
+    synsets_data = {}
+    for file in files:
+        get_data_from_picto(read_picto_json(file), keywords_data, synsets_data)
+    return keywords_data, synsets_data
+
+
+def merge_partial_data(partials):
+    """
+        Function to merge the dicts given by `parse_picto_files` for several chunks of files.
+
+        Arguments
+        ---------
+        partials : iterable[tuple]
+            Keyword -> picto ids and arasaac synset -> picto ids dicts of each chunk, in the order of the files.
+
+        Returns
+        -------
+        A tuple with the merged keyword -> picto ids and arasaac synset -> picto ids dicts.
+    """
+    merged = ({}, {})
+    for partial in partials:
+        for saved_data, partial_data in zip(merged, partial):
+            for k, v in partial_data.items():
+                if k in saved_data:
+                    saved_data[k] |= v
+                else:
+                    saved_data[k] = v
+    return merged
+
+
+def ingest_picto_files(path_picto_ids, workers=None, chunk_size=500):
+    """
+        Function to read all the arasaac json files of a directory with a pool of processes.
+        The chunks are merged in the order of the files, so the keys keep the order of a sequential read.
 
         Arguments
         ---------
         path_picto_ids : str
-            Path of the json file with arasaac picto info.
+            Path of the json files with arasaac picto info.
+        workers : int
+            Number of processes, the number of cpus if None.
+        chunk_size : int
+            Number of files parsed by a worker at once.
+
+        Returns
+        -------
+        A tuple with the keyword -> picto ids and the arasaac synset -> picto ids dicts.
+    """
+    files = [path_picto_ids + f for f in get_json_from_directory(path_picto_ids)]
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    if workers == 1:
+        return merge_partial_data(map(parse_picto_files, chunks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge_partial_data(executor.map(parse_picto_files, chunks))
+
+
+def get_wordnet_synsets_from_arasaac(synsets_data, data_wn31, synset_table=None):
+    """
+        Function to link the picto ids of each arasaac synset to the corresponding wordnet synset names.
+        Each arasaac synset is converted once, whatever the number of pictos using it.
+
+        Arguments
+        ---------
+        synsets_data : dict
+            Dict with, for each arasaac synset, the set of corresponding picto ids.
+        data_wn31 : WordNetSenseIndex
+            Index with the WordNet 3.1 infos.
+        synset_table : SynsetNameTable
+            Table of the synset names, or None to use NLTK WordNet.
+
+        Returns
+        -------
+        A dict with, for each wordnet synset name, the set of corresponding picto ids.
     """
-    files = get_json_from_directory(path_picto_ids)
     saved_data = {}
-    for f in files:
-        get_data_from_picto(path_picto_ids + f, saved_data)
-    for k, v in saved_data.items():
-        v = list(set(v))
-        saved_data[k] = v
+    for s, ids in synsets_data.items():
+        for sense in get_sense_key_from_synset(s, data_wn31):
+            synset = get_synset_name(sense, synset_table)
+            if synset is None:
+                print("No synset found for ", sense)
+                continue
+            saved_data.setdefault(synset, set()).update(ids)
+    return saved_data
+
+
+def write_names_json(keywords_data):
+    """
+        Function to write the names.json file.
+
+        Arguments
+        ---------
+        keywords_data : dict
+            Dict with, for each keyword, the set of corresponding picto ids.
+    """
     # with open("keywords_pictos.json", "w") as f:
-    #     json.dump(saved_data, f)
-    only_keywords = list(saved_data.keys())
+    #     json.dump({k: list(v) for k, v in keywords_data.items()}, f)
+    only_keywords = list(keywords_data.keys())
     with open("names.json", "w") as f2:
         json.dump(only_keywords, f2)
 
 
-def create_synsets_from_arasaac(path_picto_ids, data_wn31):
+def write_synsets_json(synsets_data):
     """
-        Function to create the synsets.json file.
+        Function to write the synsets.json file.
 
         Arguments
         ---------
-        path_picto_ids : str
-            Path of the json file with arasaac picto info.
-        data_wn31 : dataframe
-            Dataframe with the info of wordnet3.1.
+        synsets_data : dict
+            Dict with, for each wordnet synset name, the set of corresponding picto ids.
     """
-    data_wn = parse_wn31_file(data_wn31)
-    files = get_json_from_directory(path_picto_ids)
-    saved_data = {}
-    for f in files:
-        get_data_synsets_from_picto(path_picto_ids + f, data_wn, saved_data)
-    for k, v in saved_data.items():
-        v = list(set(v))
-        saved_data[k] = v
     with open("synsets.json", "w") as f:
-        json.dump(saved_data, f)
+        json.dump({k: list(v) for k, v in synsets_data.items()}, f)
 
 
-def associate_words_with_synsets_from_wolf(wolf_data, data_wn31):
+def write_wolf_jsons(results):
     """
-        Function to create the synsets_fr.json + names2.json files.
+        Function to write the synsets_fr.json + names2.json files.
 
         Arguments
         ---------
-        wolf_data : str
-            Path of the arasaac.fre .csv file.
-        data_wn31 : dataframe
-            Dataframe with the info of wordnet3.1.
+        results : dict
+            Dict with each lemma associated with their synsets (possibly with duplicates).
     """
-    data_wn = parse_wn31_file(data_wn31)
-    data_picto = get_data_from_wolf(wolf_data)
-    results = get_lemma_from_wolf_and_corresponding_synsets(data_picto, data_wn)
     for k, v in results.items():
         v = list(set(v))
         results[k] = v
@@ -255,28 +336,146 @@ def associate_words_with_synsets_from_wolf(wolf_data, data_wn31):
         json.dump(names, f2)
 
 
+def create_json_file_with_keywords_and_pictos(path_picto_ids, workers=None):
+    """
+        Function to create the names.json file.
+
+        Arguments
+        ---------
+        path_picto_ids : str
+            Path of the json file with arasaac picto info.
+        workers : int
+            Number of processes reading the json files, the number of cpus if None.
+    """
+    keywords_data, _ = ingest_picto_files(path_picto_ids, workers)
+    write_names_json(keywords_data)
+
+
+def create_synsets_from_arasaac(path_picto_ids, data_wn31, workers=None, synset_table=None):
+    """
+        Function to create the synsets.json file.
+
+        Arguments
+        ---------
+        path_picto_ids : str
+            Path of the json file with arasaac picto info.
+        data_wn31 : str
+            Path of the index.sense file with wordnet3.1 infos.
+        workers : int
+            Number of processes reading the json files, the number of cpus if None.
+        synset_table : str
+            Path of the table of synset names, or None to use NLTK WordNet.
+    """
+    data_wn = load_wn31_index(data_wn31)
+    table = load_synset_name_table(synset_table)
+    _, synsets_data = ingest_picto_files(path_picto_ids, workers)
+    write_synsets_json(get_wordnet_synsets_from_arasaac(synsets_data, data_wn, table))
+
+
+def associate_words_with_synsets_from_wolf(wolf_data, data_wn31, synset_table=None):
+    """
+        Function to create the synsets_fr.json + names2.json files.
+
+        Arguments
+        ---------
+        wolf_data : str
+            Path of the arasaac.fre .csv file.
+        data_wn31 : str
+            Path of the index.sense file with wordnet3.1 infos.
+        synset_table : str
+            Path of the table of synset names, or None to use NLTK WordNet.
+    """
+    data_wn = load_wn31_index(data_wn31)
+    table = load_synset_name_table(synset_table)
+    data_picto = get_data_from_wolf(wolf_data)
+    write_wolf_jsons(get_lemma_from_wolf_and_corresponding_synsets(data_picto, data_wn, table))
+
+
+def create_all_jsons(path_picto_ids, wolf_data, data_wn31, workers=None, synset_table=None):
+    """
+        Function to create the 4 json files at once, reading each input only once.
+
+        Arguments
+        ---------
+        path_picto_ids : str
+            Path of the json file with arasaac picto info.
+        wolf_data : str
+            Path of the arasaac.fre .csv file.
+        data_wn31 : str
+            Path of the index.sense file with wordnet3.1 infos.
+        workers : int
+            Number of processes reading the json files, the number of cpus if None.
+        synset_table : str
+            Path of the table of synset names, or None to use NLTK WordNet.
+
+        Returns
+        -------
+        A dict with the time (in seconds) of each stage.
+    """
+    timings = {}
+    with stage("index.sense", verbose=True, timings=timings):
+        data_wn = load_wn31_index(data_wn31)
+    if synset_table:
+        with stage("synset names", verbose=True, timings=timings):
+            table = load_synset_name_table(synset_table)
+    else:
+        with stage("wordnet", verbose=True, timings=timings):
+            from nltk.corpus import wordnet as wn
+            wn.ensure_loaded()
+            table = None
+    with stage("arasaac jsons", verbose=True, timings=timings):
+        keywords_data, synsets_data = ingest_picto_files(path_picto_ids, workers)
+    with stage("wolf csv", verbose=True, timings=timings):
+        data_picto = get_data_from_wolf(wolf_data)
+    with stage("names.json", verbose=True, timings=timings):
+        write_names_json(keywords_data)
+    with stage("synsets.json", verbose=True, timings=timings):
+        write_synsets_json(get_wordnet_synsets_from_arasaac(synsets_data, data_wn, table))
+    with stage("synsets_fr.json + names2.json", verbose=True, timings=timings):
+        write_wolf_jsons(get_lemma_from_wolf_and_corresponding_synsets(data_picto, data_wn, table))
+    print("*** total : " + str(round(sum(timings.values()), 2)) + " s ***\n")
+    return timings
+
+
 def choose_jsons(args):
     """Choose which type of json files to generate."""
-    if args.type == 1:
-        create_json_file_with_keywords_and_pictos(args.arasaac_jsons)
+    if args.all:
+        create_all_jsons(args.arasaac_jsons, args.wolf_data, args.data_wn31, args.workers, args.synset_table)
+    elif args.type == 1:
+        create_json_file_with_keywords_and_pictos(args.arasaac_jsons, args.workers)
     elif args.type == 2:
-        create_synsets_from_arasaac(args.arasaac_jsons, args.data_wn31)
+        create_synsets_from_arasaac(args.arasaac_jsons, args.data_wn31, args.workers, args.synset_table)
     elif args.type == 3:
-        associate_words_with_synsets_from_wolf(args.wolf_data, args.data_wn31)
+        associate_words_with_synsets_from_wolf(args.wolf_data, args.data_wn31, args.synset_table)
     else:
-        create_json_file_with_keywords_and_pictos(args.arasaac_jsons)
-
-
-parser = ArgumentParser(description="Create different json files for InteraactionPicto platforms.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--arasaac_jsons', type=str, required=True,
-                    help="Path of the json files from arasaac.")
-parser.add_argument('--wolf_data', type=str, required=True,
-                    help="Path of the .csv data with info of arasaac.")
-parser.add_argument('--data_wn31', type=str, required=True,
-                    help="Path of file with wordnet3.1 infos.")
-parser.add_argument('--type', type=int, required=True, choices=[1, 2, 3],
-                    help="Type of the json files to generate.")
-parser.set_defaults(func=choose_jsons)
-args = parser.parse_args()
-args.func(args)
+        create_json_file_with_keywords_and_pictos(args.arasaac_jsons, args.workers)
+
+
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--arasaac_jsons', type=str, required=True,
+                        help="Path of the json files from arasaac.")
+    parser.add_argument('--wolf_data', type=str, required=True,
+                        help="Path of the .csv data with info of arasaac.")
+    parser.add_argument('--data_wn31', type=str, required=True,
+                        help="Path of file with wordnet3.1 infos.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--type', type=int, choices=[1, 2, 3],
+                       help="Type of the json files to generate.")
+    group.add_argument('--all', action='store_true',
+                       help="Generate the 4 json files at once.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of processes reading the json files (default: number of cpus).")
+    parser.add_argument('--synset_table', type=str, default=None,
+                        help="Path of the table of synset names built by build_synset_name_table.py\n"
+                             "(if not given, NLTK WordNet is loaded).")
+    parser.set_defaults(func=choose_jsons)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Create different json files for InteraactionPicto platforms.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("create_json_files_for_InteraactionPicto_platforms")
+    args.func(args)
@@ -7,11 +7,11 @@ Author
  * Cécile MACAIRE 2023
 """
 
-import pandas as pd
 from argparse import ArgumentParser, RawTextHelpFormatter
 import json
 import os
 import random
+from utils import enable_run_report, count
 
 
 def read_datafile(file: str):
@@ -27,6 +27,7 @@ def read_datafile(file: str):
         -------
         A dataframe.
     """
+    import pandas as pd
     return pd.read_csv(file, sep='\t')
 
 
@@ -88,15 +89,23 @@ def create_files_json_platform(args):
     """Function to create a json file for the platform."""
     data = read_datafile(args.file)
     sentences = get_sentences(data)
+    count("corpus_rows", len(sentences))
     create_json(sentences, args.path_save)
 
 
-parser = ArgumentParser(description="Generate the json file for LitDevTool platform.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--file', type=str, required=True,
-                    help="Path of the .csv file where sentences are stored to record.")
-parser.add_argument('--path_save', type=str, required=True,
-                    help="Path where to save the generated json file.")
-parser.set_defaults(func=create_files_json_platform)
-args = parser.parse_args()
-args.func(args)
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--file', type=str, required=True,
+                        help="Path of the .csv file where sentences are stored to record.")
+    parser.add_argument('--path_save', type=str, required=True,
+                        help="Path where to save the generated json file.")
+    parser.set_defaults(func=create_files_json_platform)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Generate the json file for LitDevTool platform.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("create_json_unige_platform")
+    args.func(args)
@@ -7,14 +7,19 @@ Author
  * Cécile MACAIRE 2023
 """
 
-from ast import literal_eval
-import matplotlib.pyplot as plt
-import seaborn as sns
-import subprocess
-import json
+from collections import Counter
+from itertools import groupby
+import numpy as np
+import pandas as pd
+from arasaac_store import get_pictograms
 from utils import *
 from argparse import ArgumentParser, RawTextHelpFormatter
 
+POS_NAMES = {'NOUN': 'Noun', 'VERB': 'Verb', 'AUX': 'Auxiliary', 'DET': 'Determiner', 'CCONJ': 'Conjonction',
+             'ADJ': 'Adjective', 'ADP': 'Preposition', 'PRON': 'Pronoun', 'ADV': 'Adverb', 'INTJ': 'Interjection',
+             'NUM': 'Numeral', 'PART': 'Particle', 'PROPN': 'Proper noun', 'PUNCT': 'Punctuation',
+             'SCONJ': 'Subordinating conjunction', 'SYM': 'Symbol', 'X': 'Other', 'SPACE': 'Space'}
+
 
 def get_sentences_and_pictos(data):
     """
@@ -23,18 +28,18 @@ def get_sentences_and_pictos(data):
         Arguments
         ---------
         data : dataframe
-            Dataframe with the corpus info.
+            Dataframe with the corpus info, read with `read_corpus`.
 
         Returns
         -------
         Two files, with sentences, and picto ids respectively.
     """
     sentences = data['sentence'].tolist()
-    pictos = data['pictos_ref_ids'].apply(literal_eval).tolist()
+    pictos = data['pictos_ref_ids'].tolist()
     return sentences, pictos
 
 
-def process_sentences(sentences, spacy_model):
+def process_sentences(sentences, spacy_model, cache=None):
     """
         Function to process the sentences by using a psacy model.
 
@@ -42,26 +47,25 @@ def process_sentences(sentences, spacy_model):
         ---------
         sentences : list
             List with the sentences.
-        spacy_model : `spacy.lang.fr`
-            Spacy model to lemmatize, etc.
+        spacy_model : `spacy.lang.fr` or str
+            Spacy model to lemmatize, etc., or its name to load it only if needed.
+        cache : AnnotationCache
+            Cache of the annotations.
 
         Returns
         -------
         A list of list with words per sentence.
     """
     words_lemmas_per_s = []
-    for s in sentences:
-        doc = spacy_model(s)
+    for tokens in iter_annotations(sentences, spacy_model, cache=cache):
         word_lemma = []
-        for word in doc:
-            if word.text == "aujourd'hui":
-                word_lemma.append(["aujourd'", "aujourd'", word.pos_])
-                word_lemma.append(["hui", "hui", word.pos_])
+        for text, lemma, pos in tokens:
+            if text == "aujourd'hui":
+                word_lemma.append(["aujourd'", "aujourd'", pos])
+                word_lemma.append(["hui", "hui", pos])
             else:
-                word_lemma.append([word.text, word.lemma_, word.pos_])
+                word_lemma.append([text, lemma, pos])
         words_lemmas_per_s.append(word_lemma)
-    print("Unique words = vocab : ",
-          str(len(list(set([element[1] for sous_liste in words_lemmas_per_s for element in sous_liste])))))
     return words_lemmas_per_s
 
 
@@ -89,60 +93,126 @@ def associate_words_with_pictos(words_lemmas, pictos):
     return words_lemmas
 
 
-def stats_pictos(words_lemmas_pictos):
+def build_token_table(words_lemmas_pictos):
     """
-        Function to get some stats about the corpus (number of words in the corpus, etc.).
-        The number of annotated words in picto by grammatical categories is also generated.
+        Function to flatten the words of all the sentences into one table, with one row per token.
 
         Arguments
         ---------
         words_lemmas_pictos : list[list]
             List of list with words associated to their picto.
+
+        Returns
+        -------
+        A dataframe with the columns sentence_id, text, lemma, pos, picto (nullable) and has_picto.
+    """
+    lengths = np.fromiter((len(words) for words in words_lemmas_pictos), dtype=np.int64,
+                          count=len(words_lemmas_pictos))
+    tokens = [w for words in words_lemmas_pictos for w in words]
+    table = pd.DataFrame({
+        'sentence_id': np.repeat(np.arange(len(words_lemmas_pictos)), lengths),
+        'text': [w[0] for w in tokens],
+        'lemma': [w[1] for w in tokens],
+        'pos': pd.Categorical([w[2] for w in tokens]),
+        'picto': pd.array([w[3] if len(w) > 3 else None for w in tokens], dtype='Int64'),
+    })
+    table['has_picto'] = table['picto'].notna().to_numpy()
+    return table
+
+
+def get_coverage_per_pos(table):
+    """
+        Function to get the number and percentage of words translated in picto for each pos tag.
+
+        Arguments
+        ---------
+        table : dataframe
+            Table of the tokens, from `build_token_table`.
+
+        Returns
+        -------
+        A dataframe indexed by pos tag with the columns translated, total and percentage.
     """
-    total_words = sum([len(elem) for elem in words_lemmas_pictos])
-    average_words_pictos_corpus = 0
-    grammatical_categories_total_words = {'NOUN': [0, 0], 'VERB': [0, 0], 'AUX': [0, 0], 'DET': [0, 0], 'CCONJ': [0, 0],
-                                          'ADJ': [0, 0], 'ADP': [0, 0], 'PRON': [0, 0]}
-    for i in words_lemmas_pictos:
-        for el in i:
-            if el[3] is not None:
-                average_words_pictos_corpus += 1
-            for k, v in grammatical_categories_total_words.items():
-                if el[2] == k and el[3] is not None:
-                    grammatical_categories_total_words[k] = [v[0] + 1, v[1] + 1]
-                elif el[2] == k and el[3] is None:
-                    grammatical_categories_total_words[k] = [v[0], v[1] + 1]
+    per_pos = table.groupby('pos', observed=True)['has_picto'].agg(translated='sum', total='size')
+    per_pos['percentage'] = per_pos['translated'] / per_pos['total']
+    return per_pos.sort_values(by=['total'], ascending=False)
 
+
+def get_sentence_lengths(table, num_sentences):
+    """
+        Function to get the number of words of each sentence.
+
+        Arguments
+        ---------
+        table : dataframe
+            Table of the tokens, from `build_token_table`.
+        num_sentences : int
+            Number of sentences in the corpus (sentences without words are not in the table).
+
+        Returns
+        -------
+        A series with the number of words per sentence.
+    """
+    return pd.Series(np.bincount(table['sentence_id'].to_numpy(), minlength=num_sentences))
+
+
+def vocabulary_size(table):
+    """
+        Function to get the number of unique lemmas in the corpus.
+
+        Arguments
+        ---------
+        table : dataframe
+            Table of the tokens, from `build_token_table`.
+
+        Returns
+        -------
+        The size of the vocabulary.
+    """
+    return table['lemma'].nunique()
+
+
+def stats_pictos(table):
+    """
+        Function to get some stats about the corpus (number of words in the corpus, etc.).
+        The number of annotated words in picto by grammatical categories is also generated.
+
+        Arguments
+        ---------
+        table : dataframe
+            Table of the tokens, from `build_token_table`.
+    """
+    total_words = len(table)
+    coverage = table['has_picto'].mean() if total_words else 0.0
     print('-----------------------------\nNumber of words in the corpus : ' + str(total_words) + '\n'
-                                                                                                 'Percentage number '
-                                                                                                 'of words translated '
-                                                                                                 'into pictograms : '
-          + str(
-        round(average_words_pictos_corpus / total_words, 2) * 100) + '%\n'
-                                                                     '-----------------------------\n'
-                                                                     'Percentage of words translated in pictograms by '
-                                                                     'grammatical categories\n')
-    for k, v in grammatical_categories_total_words.items():
-        print(k + ' : ' + str(v[0] / v[1]) + '\n')
-    plot_grammar(grammatical_categories_total_words)
-
-
-def average_words_per_sentence(words_lemmas):
+          'Percentage number of words translated into pictograms : ' + str(round(coverage, 2) * 100) + '%\n'
+          '-----------------------------\n'
+          'Percentage of words translated in pictograms by grammatical categories\n')
+    per_pos = get_coverage_per_pos(table)
+    for pos, row in per_pos.iterrows():
+        print(pos + ' : ' + str(row['percentage']) + '\n')
+    plot_grammar(per_pos)
+
+
+def average_words_per_sentence(table, num_sentences):
     """
-        Function to get the average number of words per sentence.
+        Function to get the average number of words per sentence and the distribution of the sentence lengths.
 
         Arguments
         ---------
-        words_lemmas : list
-            List with the words.
+        table : dataframe
+            Table of the tokens, from `build_token_table`.
+        num_sentences : int
+            Number of sentences in the corpus.
     """
-    print("Average number of words in sentences in the corpus : ",
-          sum(map(len, words_lemmas)) / float(len(words_lemmas)))
+    lengths = get_sentence_lengths(table, num_sentences)
+    print("Average number of words in sentences in the corpus : ", lengths.mean())
+    print("Distribution of the number of words per sentence :\n", lengths.describe())
 
 
 def get_mwe(words_lem_pictos):
     """
-        Function to get MWE words.
+        Function to get MWE words : runs of at least two consecutive words of a sentence with the same picto.
 
         Arguments
         ---------
@@ -151,38 +221,38 @@ def get_mwe(words_lem_pictos):
 
         Returns
         -------
-        A list with MWE words.
+        A list of dicts with the sentence_id, the span (start, end excluded) in the sentence, the lemmas and the picto
+        of each MWE.
     """
     mwe = []
-    for i in words_lem_pictos:
-        length_sentence = len(i)
-        incr = 0
-        mwe_exp = []
-        for a, b in enumerate(i):
-            if not mwe_exp:
-                mwe_exp = [b[1]]
-            while incr < length_sentence - 1:
-                if len(mwe_exp) >= 2 and b[3] != i[a + 1][3]:
-                    mwe.append(mwe_exp)
-                    mwe_exp = []
-                    incr += 1
-                    break
-                elif b[3] == i[a + 1][3] and b[3] is not None:
-                    mwe_exp.append(i[a + 1][1])
-                    incr += 1
-                    break
-                else:
-                    incr += 1
-                    mwe_exp = [i[incr][1]]
-                    break
-            else:
-                if len(mwe_exp) >= 2:
-                    mwe.append(mwe_exp)
-    print(list(set([i for i in [' '.join(sub_list) for sub_list in mwe]])))
+    for sentence_id, words in enumerate(words_lem_pictos):
+        start = 0
+        for picto, run in groupby(words, key=lambda w: w[3] if len(w) > 3 else None):
+            run = list(run)
+            if picto is not None and len(run) >= 2:
+                mwe.append({'sentence_id': sentence_id, 'span': (start, start + len(run)),
+                            'lemmas': [w[1] for w in run], 'picto': picto})
+            start += len(run)
     return mwe
 
 
-def get_percentage_similarity_lemma_picto(words_lem_pictos):
+def count_mwe(mwe):
+    """
+        Function to count the occurrences of each MWE.
+
+        Arguments
+        ---------
+        mwe : list[dict]
+            MWE records, from `get_mwe`.
+
+        Returns
+        -------
+        A `Counter` with, for each MWE (lemmas joined by spaces), its number of occurrences.
+    """
+    return Counter(' '.join(m['lemmas']) for m in mwe)
+
+
+def get_percentage_similarity_lemma_picto(words_lem_pictos, store_path=None):
     """
         Function to get the words that are translated with non similar picto.
 
@@ -190,6 +260,8 @@ def get_percentage_similarity_lemma_picto(words_lem_pictos):
         ---------
         words_lem_pictos : list
             List with the words.
+        store_path : str
+            Path of the local arasaac store, or None to use the API.
 
         Returns
         -------
@@ -197,18 +269,18 @@ def get_percentage_similarity_lemma_picto(words_lem_pictos):
     """
     unsimilar_picto_words = []
     num_words = 0
+    ids_picto = list(set([b[3] for i in words_lem_pictos for b in i if b[3] is not None]))
+    with stage("arasaac lookup"):
+        data_per_picto = dict(zip(ids_picto, get_pictograms(ids_picto, store_path, return_exceptions=True)))
+    count("arasaac_api_requests" if store_path is None else "arasaac_store_lookups", len(ids_picto))
     for i in words_lem_pictos:
         for a, b in enumerate(i):
             if b[3] is not None:
                 num_words += 1
                 try:
-                    command = 'curl -X GET "https://api.arasaac.org/api/pictograms/fr/' + str(b[
-                                                                                                  3]) + '" -H ' \
-                                                                                                        '"accept: ' \
-                                                                                                        'application' \
-                                                                                                        '/json" '
-                    result = subprocess.check_output(command, shell=True).decode('UTF-8')
-                    data = json.loads(result)
+                    data = data_per_picto[b[3]]
+                    if isinstance(data, Exception):
+                        raise data
                     keywords = [k['keyword'] for k in data['keywords']]
                     if b[0] not in keywords and b[1] not in keywords:
                         unsimilar_picto_words.append([b[1], keywords])
@@ -219,23 +291,24 @@ def get_percentage_similarity_lemma_picto(words_lem_pictos):
     return unsimilar_picto_words
 
 
-def plot_grammar(grammatical_cat):
+def plot_grammar(per_pos):
     """
         Function to generate a plot with matplolib with percentage of words translated in picto per pos tag.
 
-        Arguments --------- grammatical_cat : dict Dictionary with, for each category, the number of words translated
-        in picto and the number of total words with the pos tag.
+        Arguments
+        ---------
+        per_pos : dataframe
+            Number and percentage of words translated in picto per pos tag, from `get_coverage_per_pos`.
     """
-    values = []
-    for k, v in grammatical_cat.items():
-        values.append(v[0] / v[1])
-    data = pd.DataFrame({'grammatical_categories': ['Noun', 'Verb', 'Auxiliary', 'Determiner', 'Conjonction',
-                                                    'Adjective', 'Preposition', 'Pronoun'], 'percentage': values})
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    data = pd.DataFrame({'grammatical_categories': [POS_NAMES.get(pos, pos) for pos in per_pos.index],
+                         'percentage': per_pos['percentage'].to_numpy()})
     data = data.sort_values(by=['percentage'], ascending=False)
     ax = sns.barplot(x='grammatical_categories', y='percentage',
                      data=data,
                      palette='Blues_d')
-    ax.set_ylim(0, 0.95)
+    ax.set_ylim(0, 1)
     plt.setp(ax.get_xticklabels(), rotation=30, horizontalalignment='right', fontsize='x-small')
     plt.title("Percentage of words in pictograms by grammatical categories")
     plt.show()
@@ -245,21 +318,38 @@ def pipeline(args):
     """
         Function to generate all stats from a corpus file.
     """
-    spacy_model = spacy.load("fr_dep_news_trf")
-    data = read_csv(args.datafile)
+    spacy_model = "fr_dep_news_trf"
+    cache = load_annotation_cache(args.nlp_cache, spacy_model)
+    data = read_corpus(args.datafile)
     sent, p = get_sentences_and_pictos(data)
-    s = process_sentences(sent, spacy_model)
+    s = process_sentences(sent, spacy_model, cache)
+    if cache:
+        cache.report()
+        cache.close()
     words_lemmas = associate_words_with_pictos(s, p)
-    get_mwe(words_lemmas)
-    average_words_per_sentence(words_lemmas)
-    # get_percentage_similarity_lemma_picto(words_lemmas)
-    stats_pictos(words_lemmas)
-
-
-parser = ArgumentParser(description="Extract the info from corpus and generate stats.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--datafile', type=str, required=True,
-                    help="Datafile")
-parser.set_defaults(func=pipeline)
-args = parser.parse_args()
-args.func(args)
+    print("MWE : ", count_mwe(get_mwe(words_lemmas)).most_common())
+    table = build_token_table(words_lemmas)
+    print("Unique words = vocab : ", str(vocabulary_size(table)))
+    average_words_per_sentence(table, len(words_lemmas))
+    # get_percentage_similarity_lemma_picto(words_lemmas, args.arasaac_store)
+    stats_pictos(table)
+
+
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--datafile', type=str, required=True,
+                        help="Datafile")
+    parser.add_argument('--nlp_cache', type=str, default=None,
+                        help="Path of the SQLite file used to cache the annotations of the spacy model.")
+    parser.add_argument('--arasaac_store', type=str, default=None,
+                        help="Path of the local arasaac store (SQLite), the API is used if not given.")
+    parser.set_defaults(func=pipeline)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Extract the info from corpus and generate stats.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("generate_stats_corpus_s2p")
+    args.func(args)
@@ -1,70 +1,87 @@
 """From the ARASAAC website, save the info of all french picto into json and download the picto .png files.
 
 Example of use:
-python get_all_pictos_arasaac_and_download_images.py --outdir ./images
+python get_all_pictos_arasaac_and_download_images.py --outdir ./images --arasaac_store arasaac.sqlite
 
 Author
  * Cécile MACAIRE 2023
 """
 
-import subprocess
 import json
-import urllib.request
+import arasaac_client
+from image_downloader import ImageDownloader, image_url
+from arasaac_store import ArasaacStore
 from argparse import ArgumentParser, RawTextHelpFormatter
 
 from utils import *
 
 
-def get_ids_pictos_arasaac_from_json():
+def get_ids_pictos_arasaac_from_json(dump_file=None, store_path=None):
     """
         Function to get the info of all picto in json file and get all picto ids.
 
+        Arguments
+        ---------
+        dump_file : str
+            Path of the json file where to save the info of all pictos.
+        store_path : str
+            Path of the SQLite store where to ingest the info of all pictos.
+
         Returns
         -------
         A list with all picto ids.
     """
-    # get the json file of all pictos arasaac from the API
-    command = 'curl -X GET "https://api.arasaac.org/api/pictograms/all/fr" -H "accept: application/json"'
-    result = subprocess.check_output(command, shell=True).decode('UTF-8')  # run the MAUS command
+    # get the json info of all pictos arasaac from the API
+    with stage("arasaac fetch"):
+        data = arasaac_client.fetch_all()
+    count("arasaac_api_requests")
+    count("pictos", len(data))
 
     # save the output json in a file
-    with open("/data/macairec/Cloud/PROPICTO_RESSOURCES/ARASAAC_Pictos_All/all_pictos_arasaac.json", 'w') as f:
-        json.dump(result, f)
+    if dump_file:
+        with open(dump_file, 'w') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    # index the info in the local store
+    if store_path:
+        with stage("arasaac ingest"):
+            store = ArasaacStore(store_path)
+            print("*** " + str(store.ingest(data)) + " pictos saved in " + store_path + " ***\n")
+            store.close()
 
     # retrieve ids from json files
-    data = json.loads(result)
     ids = [el['_id'] for el in data]
     return ids
 
 
-def download_image(id_picto, outdir):
-    """
-        Function to download a picto .png from arasaac from the picto id.
-
-        Arguments
-        ---------
-        id_picto : int
-            Picto id.
-        outdir : str
-            Path of the directory to store the .png images.
-    """
-    url = 'https://static.arasaac.org/pictograms/' + str(id_picto) + '/' + str(id_picto) + '_2500.png'
-    name_image = url.split('/')[-2] + '.png'
-    urllib.request.urlretrieve(url, outdir + name_image)
-
-
 def download_all_images(args):
-    """Function to download all the images from arasaac and save them into a specific directory."""
+    """Function to download all the images from arasaac and save them into a specific directory.
+    Images already downloaded by a previous run are skipped."""
     outdir = create_directory(args.outdir)
-    ids = get_ids_pictos_arasaac_from_json()
-    for i in ids:
-        download_image(i, outdir)
-
-
-parser = ArgumentParser(description="Download picto images from arasaac.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--outdir', type=str, required=True,
-                    help="Path of the directory to store the images.")
-parser.set_defaults(func=download_all_images)
-args = parser.parse_args()
-args.func(args)
+    ids = get_ids_pictos_arasaac_from_json(args.dump_file, args.arasaac_store)
+    downloader = ImageDownloader(outdir, max_workers=args.workers)
+    with stage("image download"):
+        stats = downloader.download_all([(image_url(i), str(i) + '.png') for i in ids])
+    count_downloads(stats)
+
+
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--outdir', type=str, required=True,
+                        help="Path of the directory to store the images.")
+    parser.add_argument('--dump_file', type=str, default=None,
+                        help="Path of the json file where to save the info of all pictos.")
+    parser.add_argument('--arasaac_store', type=str, default=None,
+                        help="Path of the SQLite store where to index the info of all pictos.")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="Number of images downloaded in parallel.")
+    parser.set_defaults(func=download_all_images)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Download picto images from arasaac.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("get_all_pictos_arasaac_and_download_images")
+    args.func(args)
@@ -8,11 +8,11 @@ Author
 """
 
 import json
-import subprocess
+from arasaac_store import get_pictograms
 from os import listdir
 from os.path import isfile, join
-import pandas as pd
 from argparse import ArgumentParser, RawTextHelpFormatter
+from utils import enable_run_report, stage, count
 
 
 def get_files_from_directory(path_picto_ids):
@@ -31,14 +31,16 @@ def get_files_from_directory(path_picto_ids):
     return [f for f in listdir(path_picto_ids) if isfile(join(path_picto_ids, f)) and f.endswith(".png")]
 
 
-def get_data_from_picto(name_file, output_path):
+def get_data_from_picto(name_file, data, output_path):
     """
-        Function to get the json info associated to the picto id and retrieve the keywords.
+        Function to save the json info associated to the picto id and retrieve the keywords.
 
         Arguments
         ---------
         name_file : str
             Name of the .png file.
+        data : dict
+            Json info of the picto from arasaac.
         output_path : str
             Directory to store the json file linked to a picto id.
 
@@ -47,12 +49,8 @@ def get_data_from_picto(name_file, output_path):
         A list with the picto id and the associated keywords.
     """
     id_picto = name_file.split('/')[-1].split('.png')[0]
-    command = 'curl -X GET "https://api.arasaac.org/api/pictograms/fr/' + str(
-        id_picto) + '" -H "accept: application/json"'
-    result = subprocess.check_output(command, shell=True).decode('UTF-8')
     with open(output_path + id_picto + '.json', "w") as f:
-        f.write(result)
-    data = json.loads(result)
+        json.dump(data, f, ensure_ascii=False)
     keywords = [k['keyword'] for k in data['keywords']]
     if not keywords:
         return id_picto, ""
@@ -65,12 +63,16 @@ def get_all_data_from_arasaac_and_save_in_csv(args):
         Function to get the json info associated to all picto ids and retrieve the keywords.
         The info are saved in a .csv file.
     """
+    import pandas as pd
     all_id_pictos = []
     all_keywords = []
     files = get_files_from_directory(args.picto_png)
-    for f in files:
+    with stage("arasaac lookup"):
+        json_data = get_pictograms([f.split('/')[-1].split('.png')[0] for f in files], args.arasaac_store)
+    count("arasaac_api_requests" if args.arasaac_store is None else "arasaac_store_lookups", len(files))
+    for f, data in zip(files, json_data):
         print("File : ", f)
-        id_picto, k = get_data_from_picto(f, args.outdir)
+        id_picto, k = get_data_from_picto(f, data, args.outdir)
         all_id_pictos.append(id_picto)
         all_keywords.append(k)
 
@@ -80,15 +82,24 @@ def get_all_data_from_arasaac_and_save_in_csv(args):
     dataframe.to_csv(args.outfile, index=False, sep='\t')
 
 
-parser = ArgumentParser(
-    description="Create a .csv file with each id picto linked to their keywords, and saved all json from arasaac.",
-    formatter_class=RawTextHelpFormatter)
-parser.add_argument('--picto_png', type=str, required=True,
-                    help="Path of the json files from arasaac.")
-parser.add_argument('--outdir', type=str, required=True,
-                    help="Path of the directory to store the json files.")
-parser.add_argument('--outfile', type=str, required=True,
-                    help="Path of the csv file with info.")
-parser.set_defaults(func=get_all_data_from_arasaac_and_save_in_csv)
-args = parser.parse_args()
-args.func(args)
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--picto_png', type=str, required=True,
+                        help="Path of the json files from arasaac.")
+    parser.add_argument('--outdir', type=str, required=True,
+                        help="Path of the directory to store the json files.")
+    parser.add_argument('--outfile', type=str, required=True,
+                        help="Path of the csv file with info.")
+    parser.add_argument('--arasaac_store', type=str, default=None,
+                        help="Path of the local arasaac store (SQLite), the API is used if not given.")
+    parser.set_defaults(func=get_all_data_from_arasaac_and_save_in_csv)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(
+        description="Create a .csv file with each id picto linked to their keywords, and saved all json from arasaac.",
+        formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("get_json_and_keywords_from_arasaac_id_pictos")
+    args.func(args)
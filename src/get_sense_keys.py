@@ -7,8 +7,7 @@ Author
  * Cécile MACAIRE 2023
 """
 
-import subprocess
-import json
+from arasaac_store import get_pictograms
 from utils import *
 from argparse import ArgumentParser, RawTextHelpFormatter
 
@@ -20,53 +19,59 @@ def get_annot_picto_ids(data):
         Arguments
         ---------
         data : dataframe
-            Data from the corpus
+            Data from the corpus, read with `read_corpus`.
 
         Returns
         -------
-        A list with the json files corresponding to each picto ids.
+        A list with the picto ids of each sentence.
     """
-    return [json.loads(i) for i in data['pictos_ref_ids'].tolist()]
+    return data['pictos_ref_ids'].tolist()
 
 
-def get_synsets_from_arasaac(id_picto):
+def get_synsets_from_arasaac(ids_picto, store_path=None):
     """
-        Function to get the synset id from a picto id.
+        Function to get the synset ids from picto ids.
 
         Arguments
         ---------
-        id_picto : int
-            Picto id.
+        ids_picto : list[int]
+            Picto ids.
+        store_path : str
+            Path of the local arasaac store, or None to use the API.
 
         Returns
         -------
-        A list with the synset(s).
+        A dict with, for each picto id, the list of its synset(s).
     """
+    ids_picto = list(set(ids_picto))
     try:
-        command = 'curl -X GET "https://api.arasaac.org/api/pictograms/fr/' + str(
-            id_picto) + '" -H "accept: application/json"'
-        result = subprocess.check_output(command, shell=True).decode('UTF-8')
-        json_data = json.loads(result)
-        return json_data["synsets"]
+        with stage("arasaac lookup"):
+            json_data = get_pictograms(ids_picto, store_path)
+        count("arasaac_api_requests" if store_path is None else "arasaac_store_lookups", len(ids_picto))
+        return {i: data["synsets"] for i, data in zip(ids_picto, json_data)}
     except Exception as e:
         raise RuntimeError(e)
 
 
-def get_synsets_from_ids_and_add_sense_keys(ids_picto, data_wn31):
+def get_synsets_from_ids_and_add_sense_keys(ids_picto, data_wn31, store_path=None):
     """
         Function to get the synset ids and add sense key(s) from picto ids.
 
         Arguments
         ---------
-        id_picto : int
-            Picto id.
-        data_wn31 : dataframe
-            Data from wordnet3.1.
+        ids_picto : list[list[list[int]]]
+            Picto ids per word per sentence.
+        data_wn31 : WordNetSenseIndex
+            Index with the WordNet 3.1 infos.
+        store_path : str
+            Path of the local arasaac store, or None to use the API.
 
         Returns
         -------
         A list with the sense keys per sentence.
     """
+    synsets_per_picto = get_synsets_from_arasaac([el for sentence in ids_picto for id in sentence if id for el in id],
+                                                 store_path)
     all_sense_keys = []
     for sentence in ids_picto:
         sense_keys_per_sentence = []
@@ -74,9 +79,7 @@ def get_synsets_from_ids_and_add_sense_keys(ids_picto, data_wn31):
             if id:
                 sense_keys = []
                 for el in id:
-                    synsets = get_synsets_from_arasaac(el)
-                    for s in synsets:
-                        sense_keys_picto = get_sense_key_from_synset_2(s, data_wn31)
+                    for sense_keys_picto in data_wn31.lookup_many(synsets_per_picto[el]):
                         sense_keys.extend(sense_keys_picto)
                 sense_keys_per_sentence.append(sense_keys)  # ajoute les sense_keys par picto
             else:
@@ -89,22 +92,31 @@ def add_sense_keys_to_data(args):
     """
         Function to add the sense key(s) to the dataframe and create a new csv file.
     """
-    data_from_corpus = read_csv(args.datafile)
+    data_from_corpus = read_corpus(args.datafile)
     picto_ids = get_annot_picto_ids(data_from_corpus)
-    wn31_data = parse_wn31_file(args.data_wn31)
-    sense_keys = get_synsets_from_ids_and_add_sense_keys(picto_ids, wn31_data)
+    wn31_data = load_wn31_index(args.data_wn31)
+    sense_keys = get_synsets_from_ids_and_add_sense_keys(picto_ids, wn31_data, args.arasaac_store)
     data_from_corpus["sense_keys"] = sense_keys
     data_from_corpus.to_csv(args.outfile, index=False, sep='\t')
 
 
-parser = ArgumentParser(description="Add sense keys to corpus file with sentences and picto ids.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--datafile', type=str, required=True,
-                    help="Path of the data file.")
-parser.add_argument('--data_wn31', type=str, required=True,
-                    help="Path of file with wordnet3.1 infos.")
-parser.add_argument('--outfile', type=str, required=True,
-                    help="Name of the new data file generated.")
-parser.set_defaults(func=add_sense_keys_to_data)
-args = parser.parse_args()
-args.func(args)
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--datafile', type=str, required=True,
+                        help="Path of the data file.")
+    parser.add_argument('--data_wn31', type=str, required=True,
+                        help="Path of file with wordnet3.1 infos.")
+    parser.add_argument('--outfile', type=str, required=True,
+                        help="Name of the new data file generated.")
+    parser.add_argument('--arasaac_store', type=str, default=None,
+                        help="Path of the local arasaac store (SQLite), the API is used if not given.")
+    parser.set_defaults(func=add_sense_keys_to_data)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="Add sense keys to corpus file with sentences and picto ids.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("get_sense_keys")
+    args.func(args)
@@ -0,0 +1,247 @@
+"""Concurrent and resumable download of the picto images from ARASAAC.
+Each image is first written in a temporary file and renamed once complete, and the completed files are recorded
+in a manifest so an interrupted download can be restarted without fetching them again.
+
+Example of use:
+    downloader = ImageDownloader("./images/", max_workers=16)
+    downloader.download_all([(image_url(2239), "2239.png")])
+
+Author
+ * Cécile MACAIRE 2023
+"""
+
+import os
+import json
+import time
+import shutil
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+STATIC_URL = "https://static.arasaac.org/pictograms/"
+
+
+def image_url(id_picto, resolution=2500):
+    """
+        Function to get the url of the .png image of a picto.
+
+        Arguments
+        ---------
+        id_picto : int
+            Picto id.
+        resolution : int
+            Size of the image in pixels.
+
+        Returns
+        -------
+        The url of the image.
+    """
+    return STATIC_URL + str(id_picto) + '/' + str(id_picto) + '_' + str(resolution) + '.png'
+
+
+class ImageDownloader:
+    """Class which downloads files with a pool of threads into a directory with a manifest of completed files."""
+
+    def __init__(self, outdir, max_workers=8, manifest_name="manifest.jsonl", timeout=60):
+        self.outdir = outdir
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.manifest_path = os.path.join(outdir, manifest_name)
+        self.manifest = self.read_manifest()
+        self.lock = threading.Lock()
+
+    def read_manifest(self):
+        """
+            Function to read the manifest of the already downloaded files.
+
+            Returns
+            -------
+            A dict with, for each complete file name, its size in bytes.
+        """
+        manifest = {}
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # last line can be truncated if the process was killed while writing it
+                        continue
+                    manifest[entry["name"]] = entry["size"]
+        return manifest
+
+    def is_complete(self, name):
+        """
+            Function to check if a file is already downloaded (in the manifest and with the same size on disk).
+
+            Arguments
+            ---------
+            name : str
+                Name of the file in the output directory.
+
+            Returns
+            -------
+            True if the file does not need to be downloaded.
+        """
+        path = os.path.join(self.outdir, name)
+        return name in self.manifest and os.path.isfile(path) and os.path.getsize(path) == self.manifest[name]
+
+    def record(self, name, size):
+        """
+            Function to add a complete file to the manifest.
+
+            Arguments
+            ---------
+            name : str
+                Name of the file in the output directory.
+            size : int
+                Size of the file in bytes.
+        """
+        with self.lock:
+            self.manifest[name] = size
+            with open(self.manifest_path, 'a') as f:
+                f.write(json.dumps({"name": name, "size": size}) + '\n')
+
+    def download(self, url, name):
+        """
+            Function to download a file into a temporary file and rename it once complete.
+            The temporary file is removed if the download fails.
+
+            Arguments
+            ---------
+            url : str
+                Url of the file.
+            name : str
+                Name of the file in the output directory.
+
+            Returns
+            -------
+            The size of the downloaded file in bytes.
+        """
+        path = os.path.join(self.outdir, name)
+        tmp_path = path + '.part'
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response, open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(response, f)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        self.record(name, size)
+        return size
+
+    def download_all(self, items):
+        """
+            Function to download several files concurrently, skipping the ones already complete.
+
+            Arguments
+            ---------
+            items : list[tuple]
+                (url, file name) of each file to download, a name given several times is downloaded once (from its
+                first url).
+
+            Returns
+            -------
+            A dict with the number of downloaded, skipped and failed files, the size and the throughput.
+        """
+        os.makedirs(self.outdir, exist_ok=True)
+        # two threads must not write the same .part file
+        urls = {}
+        for url, name in items:
+            urls.setdefault(name, url)
+        to_download = [(url, name) for name, url in urls.items() if not self.is_complete(name)]
+        stats = {"downloaded": 0, "skipped": len(urls) - len(to_download), "failed": 0, "bytes": 0}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.download, url, name): url for url, name in to_download}
+            for future in as_completed(futures):
+                try:
+                    stats["bytes"] += future.result()
+                    stats["downloaded"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    print("Could not download " + futures[future] + " : ", e)
+        stats["seconds"] = time.perf_counter() - start
+        stats["files_per_s"] = stats["downloaded"] / stats["seconds"] if stats["seconds"] else 0.0
+        stats["mb_per_s"] = stats["bytes"] / 1e6 / stats["seconds"] if stats["seconds"] else 0.0
+        print("*** " + str(stats["downloaded"]) + " downloaded, " + str(stats["skipped"]) + " skipped, "
+              + str(stats["failed"]) + " failed : " + str(round(stats["files_per_s"], 2)) + " files/s, "
+              + str(round(stats["mb_per_s"], 2)) + " MB/s ***\n")
+        return stats
+
+
+class ImageStore:
+    """Class which keeps a single copy of each picto image (one file per picto id and resolution) and creates
+    views of it in other directories with hard links (or symbolic links if hard links are not possible)."""
+
+    def __init__(self, store_dir, resolution=2500, max_workers=8):
+        self.store_dir = store_dir
+        self.resolution = resolution
+        self.downloader = ImageDownloader(store_dir, max_workers=max_workers)
+
+    def name(self, id_picto):
+        """
+            Function to get the file name of the image of a picto in the store.
+
+            Arguments
+            ---------
+            id_picto : int
+                Picto id.
+
+            Returns
+            -------
+            The file name, with the id and the resolution of the image.
+        """
+        return str(id_picto) + '_' + str(self.resolution) + '.png'
+
+    def path(self, id_picto):
+        """
+            Function to get the path of the image of a picto in the store.
+
+            Arguments
+            ---------
+            id_picto : int
+                Picto id.
+
+            Returns
+            -------
+            The path of the image.
+        """
+        return os.path.join(self.store_dir, self.name(id_picto))
+
+    def ensure(self, ids_picto):
+        """
+            Function to download the images of the pictos which are not yet in the store.
+
+            Arguments
+            ---------
+            ids_picto : list[int]
+                Picto ids, possibly with duplicates.
+
+            Returns
+            -------
+            The download statistics of `ImageDownloader.download_all`.
+        """
+        unique_ids = list(dict.fromkeys(ids_picto))
+        return self.downloader.download_all([(image_url(i, self.resolution), self.name(i)) for i in unique_ids])
+
+    def link(self, id_picto, destination):
+        """
+            Function to create a view of the image of a picto at the destination path.
+
+            Arguments
+            ---------
+            id_picto : int
+                Picto id.
+            destination : str
+                Path of the view to create, replaced if it already exists.
+        """
+        source = self.path(id_picto)
+        if os.path.lexists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            os.symlink(os.path.abspath(source), destination)
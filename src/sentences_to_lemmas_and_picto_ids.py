@@ -8,11 +8,7 @@ Author
  * Cécile MACAIRE 2023
 """
 
-import subprocess
-import json
-import stanza
-import urllib.request
-import re
+from image_downloader import ImageStore
 from utils import *
 from argparse import ArgumentParser, RawTextHelpFormatter
 
@@ -30,50 +26,78 @@ def get_sentences(file):
         -------
         A list with the sentences.
     """
+    import pandas as pd
     data = pd.read_csv(file, sep=',')
     return data['sentence'].tolist()
 
 
-def preprocessing(sentences):
+def remove_ignored_chars(lemmas):
+    """
+        Function to remove the characters to ignore from the lemmas, in a single pass of the regex.
+
+        Arguments
+        ---------
+        lemmas : list[str]
+            Lemmas of a sentence.
+
+        Returns
+        -------
+        The lemmas without the characters to ignore (empty lemmas are removed).
+    """
+    # "\0" is not in the characters to ignore, so it safely separates the lemmas during the substitution
+    return list(filter(None, chars_to_ignore_pattern.sub('', '\0'.join(lemmas)).split('\0')))
+
+
+def preprocessing(sentences, batch_size=64):
     """
         Function to process the sentences with stanza library.
+        The sentences are given to stanza by batches of documents, each sentence stays a separate document
+        so the lemmas are the same as when processing the sentences one by one.
+        If the annotation server (annotation_server.py) is running, its already loaded pipeline is used.
 
         Arguments
         ---------
         sentences : list
             Sentences retrieved from the .csv file.
+        batch_size : int
+            Number of sentences processed together by stanza.
 
         Returns
         -------
         A list of lists with the lemmas of words of each sentences.
     """
-    nlp = stanza.Pipeline(lang='fr', processors='tokenize,mwt,pos,lemma')
+    # the pipeline of the annotation server is used if it is running
+    client = connect_annotation_server(backend="stanza", model="fr")
+    nlp = load_stanza_pipeline('fr') if client is None else None
     sent_prep = []
-    for s in sentences:
-        doc = nlp(s)
-        lemmas = [word.lemma for sent in doc.sentences for word in sent.words if word.pos != 'PUNCT']
-        lemmas = list(filter(None, [re.sub(chars_to_ignore_regex, '', i) for i in lemmas]))
-        sent_prep.append(lemmas)
+    for batch in iter_chunks(sentences, batch_size):
+        if client is not None:
+            for words in client.annotate("stanza", "fr", batch, batch_size):
+                lemmas = [lemma for text, lemma, pos in words if pos != 'PUNCT']
+                sent_prep.append(remove_ignored_chars(lemmas))
+            continue
+        for doc in nlp.bulk_process(batch):
+            lemmas = [word.lemma for sent in doc.sentences for word in sent.words if word.pos != 'PUNCT']
+            sent_prep.append(remove_ignored_chars(lemmas))
+    if client is not None:
+        client.close()
     return sent_prep
 
 
-def get_ids_pictos_from_word(word):
+def get_ids_pictos_from_word(word, data):
     """
         Function to get the picto ids from the word.
 
         Arguments
         ---------
         word : str
+        data : list
+            Json answer of the arasaac search for the word.
 
         Returns
         -------
         The picto ids linked to the word in arasaac.
     """
-    mapping = dict(zip(special_char, equivalent))
-    word_for_url = ''.join(mapping.get(c, c) for c in word)
-    command = 'curl -X GET "https://api.arasaac.org/api/pictograms/fr/search/' + word_for_url + '" -H "accept: application/json"'
-    result = subprocess.check_output(command, shell=True).decode('UTF-8')
-    data = json.loads(result)
     ids = []
     for el in data:
         keywords = [k['keyword'] for k in el['keywords']]  # check if the word is in the keywords, else not printed
@@ -82,48 +106,68 @@ def get_ids_pictos_from_word(word):
     return ids
 
 
-def download_image(url, word, outdir):
+def get_ids_pictos_from_words(words):
     """
-        Function to download an image.
+        Function to search concurrently the picto ids of several words.
+        A word whose search failed (e.g. timeout) has no picto id, the other words are still searched.
 
         Arguments
         ---------
-        url : str
-            Url of the image to download.
-        word : str
-            Word which is linked to the picto.
-        outdir : str
-            Directory where to store the downloaded image.
-    """
-    name_image = url.split('/')[-2] + '_' + word + '.png'
-    urllib.request.urlretrieve(url, outdir + name_image)
+        words : list[str]
 
-
-def get_pictos_per_doc(sentences, outdir):
+        Returns
+        -------
+        A dict with the picto ids linked to each word in arasaac.
+    """
+    import arasaac_client
+    words = list(set(words))
+    with stage("arasaac search"):
+        results = arasaac_client.search(words, return_exceptions=True)
+    count("arasaac_api_requests", len(words))
+    ids_per_word = {}
+    for w, data in zip(words, results):
+        if isinstance(data, Exception):
+            print("No pictogram for " + w + " : ", data)
+            count("arasaac_failed_searches")
+            ids_per_word[w] = []
+        else:
+            ids_per_word[w] = get_ids_pictos_from_word(w, data)
+    return ids_per_word
+
+
+def get_pictos_per_doc(sentences, outdir, image_store=None):
     """
-        Function to get the picto ids from the words and download the image.
+        Function to get the picto ids from the words and get the images.
+        Each image is downloaded once in the image store, the directories per sentence only contain links to it.
 
         Arguments
         ---------
         sentences : list
             Sentences from the .csv file.
         outdir : str
-            Directory where to store the downloaded images.
+            Directory where to store the images per sentence.
+        image_store : str
+            Directory where the images are downloaded, `outdir`/store/ if not given.
 
         Returns
         -------
         A list of list with picto ids per sentence.
     """
+    ids_per_word = get_ids_pictos_from_words([w for s in sentences for w in s])
+    store = ImageStore(image_store or create_directory(outdir, "store"))
+    with stage("image download"):
+        stats = store.ensure([e for ids in ids_per_word.values() for e in ids])
+    count_downloads(stats)
     all_ids = []
     for i, s in enumerate(sentences):
         dir_to_save = create_directory(outdir, str(i))
         ids_per_sentence = []
         for w in s:
-            ids = get_ids_pictos_from_word(w)
+            ids = ids_per_word[w]
             ids_per_sentence.append(ids)
             for e in ids:
-                download_image('https://static.arasaac.org/pictograms/' + str(e) + '/' + str(e) + '_2500.png', w,
-                               dir_to_save)
+                if os.path.isfile(store.path(e)):
+                    store.link(e, dir_to_save + str(e) + '_' + w + '.png')
         all_ids.append(ids_per_sentence)
     return all_ids
 
@@ -141,6 +185,7 @@ def add_ids_to_data(ids, lemma_sent, csv_file):
         csv_file : str
             File where the data are stored.
     """
+    import pandas as pd
     data = pd.read_csv(csv_file, sep=',')
     pictos_ids = pd.DataFrame({'lemma': lemma_sent, 'pictos_all_ids': ids})
     data = data.merge(pictos_ids, left_index=True, right_index=True)
@@ -152,20 +197,33 @@ def sentences_to_lemmas_and_picto_ids(args):
         Function to get lemmas and picto ids per sentence and store it in .csv file.
     """
     sentences = get_sentences(args.csv_file)
-    sent_prep = preprocessing(sentences)
-    ids = get_pictos_per_doc(sent_prep, args.outdir)
+    count("corpus_rows", len(sentences))
+    sent_prep = preprocessing(sentences, args.batch_size)
+    ids = get_pictos_per_doc(sent_prep, args.outdir, args.image_store)
     add_ids_to_data(ids, sent_prep, args.csv_file_out)
 
 
-parser = ArgumentParser(description="From sentences, get the lemmas and possible linked picto ids."
-                                    "A new .csv file will be created.",
-                        formatter_class=RawTextHelpFormatter)
-parser.add_argument('--csv_file', type=str, required=True,
-                    help="Path of the .csv file.")
-parser.add_argument('--outdir', type=str, required=True,
-                    help="Path the directory to store the picto images per sentence.")
-parser.add_argument('--csv_file_out', type=str, required=True,
-                    help="Name of the .csv file with added information.")
-parser.set_defaults(func=sentences_to_lemmas_and_picto_ids)
-args = parser.parse_args()
-args.func(args)
+def build_parser(parser):
+    """Function to add the arguments of the script to a parser (also used by corpora_s2p.py)."""
+    parser.add_argument('--csv_file', type=str, required=True,
+                        help="Path of the .csv file.")
+    parser.add_argument('--outdir', type=str, required=True,
+                        help="Path the directory to store the picto images per sentence.")
+    parser.add_argument('--csv_file_out', type=str, required=True,
+                        help="Name of the .csv file with added information.")
+    parser.add_argument('--image_store', type=str, default=None,
+                        help="Path of the directory where each picto image is downloaded once\n"
+                             "(default: outdir/store/).")
+    parser.add_argument('--batch_size', type=int, default=64,
+                        help="Number of sentences lemmatized together by stanza.")
+    parser.set_defaults(func=sentences_to_lemmas_and_picto_ids)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser(ArgumentParser(description="From sentences, get the lemmas and possible linked picto ids."
+                                         "A new .csv file will be created.",
+                                         formatter_class=RawTextHelpFormatter))
+    args = parser.parse_args()
+    enable_run_report("sentences_to_lemmas_and_picto_ids")
+    args.func(args)
@@ -5,17 +5,297 @@ Author
 """
 
 import os
-import pandas as pd
-import spacy
+import re
+import sys
+import ast
+import json
+import time
+import atexit
+import hashlib
+import stat
+import socket
+import sqlite3
+import tempfile
+from functools import lru_cache
+from collections import Counter
+from importlib import metadata
+from itertools import chain, groupby
+import xml.etree.ElementTree as ET
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:
+    # not available on Windows, the peak memory is not reported
+    resource = None
+
 chars_to_ignore_regex = '[\,\?\.\!\-\;\:\"\“\%\‘\”\\n\-\_\'\…\[\]\&\(\)\*\/]'
+chars_to_ignore_pattern = re.compile(chars_to_ignore_regex)
+
+list_token_pattern = re.compile(r"""\[|\]|-?\d+|'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^\s,]""")
+
+
+def default_annotation_socket():
+    """
+        Function to get the default path of the Unix socket of the annotation server, private to the current user :
+        in $XDG_RUNTIME_DIR if it is set, else in the temporary directory with the uid in its name.
+
+        Returns
+        -------
+        The path of the socket.
+    """
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "corpora_s2p_annotation.sock")
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tempfile.gettempdir(), "corpora_s2p_annotation_" + str(uid) + ".sock")
+
+
+def is_own_socket(path):
+    """
+        Function to check that a path is a Unix socket owned by the current user.
+
+        Arguments
+        ---------
+        path : str
+
+        Returns
+        -------
+        True if the path is a socket of the current user, False otherwise (or if it does not exist).
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and (not hasattr(os, "getuid") or info.st_uid == os.getuid())
+
+
+# Unix socket of the annotation server (annotation_server.py), set ANNOTATION_SERVER_SOCKET="" to never use it
+ANNOTATION_SERVER_SOCKET = os.environ.get("ANNOTATION_SERVER_SOCKET", default_annotation_socket())
+
+# attributes of a <word> in the UFSAC xml files
+UFSAC_WORD_ATTRIBUTES = ['surface_form', 'lemma', 'pos', 'wn30_key', 'id']
+
+# columns of the corpus files where each cell is a list with one list per word
+LIST_COLUMNS = ['pictos_ref_ids', 'sense_keys']
 
 special_char = ['à', 'â', 'ä', 'ç', 'è', 'é', 'ê', 'ë', 'î', 'ï', 'ô', 'ö', 'ù', 'û', 'ü']
 equivalent = ['%C3%' + s for s in
               ['A0', 'A2', 'A4', 'A7', 'A8', 'A9', 'AA', 'AB', 'AE', 'AF', 'B4', 'B6', 'B9', 'BB', 'BC']]
 
 
+class RunReport:
+    """Class which collects the time of the stages, the counters and the peak memory (RSS) of a run.
+    The report is saved as json when the script exits, see `enable_run_report`."""
+
+    def __init__(self):
+        self.script = None
+        self.path = None
+        self.enabled = False
+        self.error = None
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.stages = {}
+        self.counters = Counter()
+
+    def add_stage(self, name, seconds):
+        """
+            Function to add the time of a stage (a stage can run several times, its times are added).
+
+            Arguments
+            ---------
+            name : str
+                Name of the stage.
+            seconds : float
+                Time of the stage.
+        """
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_rss_mb": None})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        entry["peak_rss_mb"] = peak_rss_mb()
+
+    def reset(self):
+        """Function to remove the stages and counters, e.g. in a worker process which sends them to its parent."""
+        self.stages = {}
+        self.counters = Counter()
+
+    def merge(self, stages, counters):
+        """
+            Function to add the stages and counters of another report (e.g. of a worker process) to this report.
+
+            Arguments
+            ---------
+            stages : dict
+                Stages of the other report.
+            counters : dict
+                Counters of the other report.
+        """
+        for name, entry in stages.items():
+            own = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_rss_mb": None})
+            own["seconds"] += entry["seconds"]
+            own["calls"] += entry["calls"]
+            own["peak_rss_mb"] = max(filter(None, [own["peak_rss_mb"], entry["peak_rss_mb"]]), default=None)
+        self.counters.update(counters)
+
+    def to_dict(self):
+        """
+            Function to get the report of the run.
+
+            Returns
+            -------
+            A dict which can be saved as json.
+        """
+        return {"script": self.script, "argv": sys.argv[1:], "pid": os.getpid(),
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+                "wall_seconds": time.perf_counter() - self.start, "cpu_seconds": time.process_time() - self.start_cpu,
+                "peak_rss_mb": peak_rss_mb(), "peak_rss_children_mb": peak_rss_mb(children=True),
+                "error": self.error, "stages": self.stages, "counters": dict(self.counters)}
+
+    def write(self):
+        """Function to save the report in a json file (or a directory) given by `path`, or to print it on stderr."""
+        report = json.dumps(self.to_dict(), ensure_ascii=False)
+        if not self.path:
+            print(report, file=sys.stderr)
+            return
+        path = self.path
+        if os.path.isdir(path):
+            path = os.path.join(path, str(self.script) + '_' + time.strftime("%Y%m%d-%H%M%S") + '_'
+                                + str(os.getpid()) + '.json')
+        with open(path, 'w') as f:
+            f.write(report + '\n')
+
+
+# report of the current process
+run_report = RunReport()
+
+
+def peak_rss_mb(children=False):
+    """
+        Function to get the peak memory (resident set size) of the process.
+
+        Arguments
+        ---------
+        children : bool
+            If True, the peak of the terminated child processes (e.g. workers of a pool) instead.
+
+        Returns
+        -------
+        The peak RSS in MB, None if it is not available.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(usage.ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+class StageTimer:
+    """Context manager which adds its time to a stage of the run report."""
+
+    def __init__(self, name, verbose=False, timings=None):
+        self.name = name
+        self.verbose = verbose
+        self.timings = timings
+        self.seconds = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self.start
+        run_report.add_stage(self.name, self.seconds)
+        if self.timings is not None:
+            self.timings[self.name] = self.seconds
+        if self.verbose:
+            print("*** " + self.name + " : " + str(round(self.seconds, 2)) + " s ***")
+
+
+def stage(name, verbose=False, timings=None):
+    """
+        Function to time a stage of a script (model load, nlp, lookups, I/O, network...) :
+
+            with stage("read corpus"):
+                data = read_corpus(path)
+
+        The stages can be nested, the time of a stage includes the time of the stages inside it.
+
+        Arguments
+        ---------
+        name : str
+            Name of the stage.
+        verbose : bool
+            If True, the time of the stage is also printed.
+        timings : dict
+            Dict where the time of the stage (in seconds) is also saved.
+
+        Returns
+        -------
+        A `StageTimer`.
+    """
+    return StageTimer(name, verbose, timings)
+
+
+def count(name, n=1):
+    """
+        Function to increase a counter of the run report (rows, tokens, API calls, cache hits, lookups...).
+
+        Arguments
+        ---------
+        name : str
+            Name of the counter.
+        n : int
+            Value to add.
+    """
+    run_report.counters[name] += n
+
+
+def count_downloads(stats):
+    """
+        Function to add the statistics of a download to the counters of the run report.
+
+        Arguments
+        ---------
+        stats : dict
+            Statistics returned by `ImageDownloader.download_all` or `ImageStore.ensure`.
+    """
+    count("images_downloaded", stats["downloaded"])
+    count("images_skipped", stats["skipped"])
+    count("images_failed", stats["failed"])
+    count("bytes_downloaded", stats["bytes"])
+
+
+def enable_run_report(script, path=None):
+    """
+        Function to save the run report when the script exits, called once by each script.
+
+        Arguments
+        ---------
+        script : str
+            Name of the script.
+        path : str
+            Path of the json file (or of a directory where a file per run is created). By default the RUN_REPORT
+            environment variable, and if it is not set the report is printed on stderr.
+
+        Returns
+        -------
+        The `RunReport` of the process.
+    """
+    run_report.script = script
+    run_report.path = path if path is not None else os.environ.get("RUN_REPORT")
+    if not run_report.enabled:
+        run_report.enabled = True
+        excepthook = sys.excepthook
+
+        def record_error(exc_type, exc_value, traceback):
+            run_report.error = exc_type.__name__ + ": " + str(exc_value)
+            excepthook(exc_type, exc_value, traceback)
+
+        sys.excepthook = record_error
+        atexit.register(run_report.write)
+    return run_report
+
+
 def get_file_names(folder):
     """
         Function to get the names of file in a directory.
@@ -49,12 +329,173 @@ def read_csv(path_data):
         -------
         A pandas dataframe.
     """
+    import pandas as pd
     return pd.read_csv(path_data, sep='\t')
 
 
+def parse_nested_list(text):
+    """
+        Function to parse one cell of a list column with the restricted grammar of the corpus files :
+        a list of lists of ints or quoted strings (e.g. "[[9001], []]" or "[['be%2:42:00::'], []]").
+
+        Arguments
+        ---------
+        text : str
+            Content of the cell.
+
+        Returns
+        -------
+        The parsed list of lists.
+    """
+    words = []
+    current = None
+    depth = 0
+    for token in list_token_pattern.findall(text):
+        if token == '[':
+            depth += 1
+            if depth == 2:
+                current = []
+            elif depth > 2:
+                raise ValueError("Too many nested lists : " + text)
+        elif token == ']':
+            if depth == 2:
+                words.append(current)
+            depth -= 1
+            if depth < 0:
+                raise ValueError("Unbalanced brackets : " + text)
+        elif depth != 2:
+            raise ValueError("Value outside of a word list : " + text)
+        elif token[0] in '\'"':
+            current.append(ast.literal_eval(token) if '\\' in token else token[1:-1])
+        elif token.lstrip('-').isdigit():
+            current.append(int(token))
+        else:
+            raise ValueError("Unexpected character " + repr(token) + " : " + text)
+    if depth != 0:
+        raise ValueError("Unbalanced brackets : " + text)
+    return words
+
+
+def flatten_list_column(rows):
+    """
+        Function to flatten a parsed list column into offset arrays and values (CSR layout).
+
+        Arguments
+        ---------
+        rows : list[list[list]]
+            Parsed list column, from `parse_list_column`.
+
+        Returns
+        -------
+        A tuple (row_offsets, word_offsets, values) : the words of row i are the words row_offsets[i] to
+        row_offsets[i + 1] (excluded), and the values of word j are values[word_offsets[j]:word_offsets[j + 1]].
+    """
+    import numpy as np
+    row_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, rows), dtype=np.int64, count=len(rows)), out=row_offsets[1:])
+    words = list(chain.from_iterable(rows))
+    word_offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, words), dtype=np.int64, count=len(words)), out=word_offsets[1:])
+    values = list(chain.from_iterable(words))
+    if all(isinstance(v, int) for v in values):
+        values = np.array(values, dtype=np.int64)
+    else:
+        values = np.array(values, dtype=object)
+    return row_offsets, word_offsets, values
+
+
+def parse_list_column(column, flat=False):
+    """
+        Function to parse a column of a .csv corpus file where each cell is a (nested) list written as a string.
+        The cells where no string needs escaping (almost all of them) are decoded at once by the json parser,
+        the other ones are parsed with `parse_nested_list`.
+
+        Arguments
+        ---------
+        column : series
+            Column with the lists as strings.
+        flat : bool
+            If True, return the offset arrays and values of `flatten_list_column` instead of nested lists.
+
+        Returns
+        -------
+        A list with, for each cell, the parsed list (empty if the cell is empty).
+    """
+    cells = [cell if isinstance(cell, str) else '[]' for cell in column.tolist()]
+    # python writes a string with single quotes unless it contains one, so in the cells without double quotes and
+    # backslashes the single quotes can be turned into json quotes
+    simple = [i for i, cell in enumerate(cells) if '"' not in cell and '\\' not in cell]
+    rows = [None] * len(cells)
+    try:
+        decoded = json.loads(('[' + ','.join([cells[i] for i in simple]) + ']').replace("'", '"'))
+    except ValueError:
+        decoded = None
+    if decoded is not None and len(decoded) == len(simple):
+        for i, row in zip(simple, decoded):
+            rows[i] = row
+    for i, row in enumerate(rows):
+        if row is None:
+            rows[i] = parse_nested_list(cells[i])
+    return flatten_list_column(rows) if flat else rows
+
+
+def read_corpus(path_data):
+    """
+        Function to read a corpus file (.csv or .parquet) with the list columns (pictos_ref_ids, sense_keys) parsed.
+        A .parquet file is memory-mapped and its list columns are already typed, so nothing has to be parsed.
+
+        Arguments
+        ---------
+        path_data : str
+            Path of the .csv or .parquet corpus file.
+
+        Returns
+        -------
+        A pandas dataframe, where each cell of the list columns is a python list.
+    """
+    with stage("read corpus"):
+        if path_data.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            table = pq.read_table(path_data, memory_map=True)
+            data = table.drop([c for c in LIST_COLUMNS if c in table.column_names]).to_pandas()
+            for c in LIST_COLUMNS:
+                if c in table.column_names:
+                    data[c] = table.column(c).to_pylist()
+            data = data[table.column_names]
+        else:
+            data = read_csv(path_data)
+            for c in LIST_COLUMNS:
+                if c in data.columns:
+                    data[c] = parse_list_column(data[c])
+    count("corpus_rows", len(data))
+    return data
+
+
+def export_corpus_parquet(data, parquet_file):
+    """
+        Function to save a corpus in a .parquet file, with the list columns stored as nested lists.
+
+        Arguments
+        ---------
+        data : dataframe
+            Corpus read with `read_corpus`.
+        parquet_file : str
+            Path of the .parquet file to create.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = {'pictos_ref_ids': pa.list_(pa.list_(pa.int64())), 'sense_keys': pa.list_(pa.list_(pa.string()))}
+    # the other columns keep their pandas type, a missing value (NaN) is stored as null
+    columns = {c: pa.array(data[c].tolist(), type=types[c]) if c in types else pa.array(data[c], from_pandas=True)
+               for c in data.columns}
+    pq.write_table(pa.table(columns), parquet_file)
+
+
+@lru_cache(maxsize=None)
 def load_spacy_model(model_name):
     """
         Function to load a spacy model given as input.
+        A model is only loaded once per process, the next calls give the same object.
 
         Arguments
         ---------
@@ -69,7 +510,9 @@ def load_spacy_model(model_name):
 
     # Load the spacy model
     try:
-        nlp = spacy.load(model_name)
+        with stage("model load"):
+            import spacy
+            nlp = spacy.load(model_name)
         print("*** Spacy model ready to use : " + model_name + " ***\n")
         return nlp
 
@@ -78,6 +521,457 @@ def load_spacy_model(model_name):
         raise RuntimeError(e)
 
 
+@lru_cache(maxsize=None)
+def load_stanza_pipeline(lang="fr", processors="tokenize,mwt,pos,lemma"):
+    """
+        Function to load a stanza pipeline, only once per process.
+
+        Arguments
+        ---------
+        lang : str
+            Language of the pipeline.
+        processors : str
+            Processors of the pipeline.
+
+        Returns
+        -------
+        The `stanza.Pipeline`.
+    """
+    with stage("model load"):
+        import stanza
+        return stanza.Pipeline(lang=lang, processors=processors)
+
+
+class AnnotationCache:
+    """Class which stores on disk (SQLite) the (text, lemma, pos) annotations of sentences.
+    The key of a sentence is a hash of its text with the name and version of the model, so a new model version
+    never reuses old annotations."""
+
+    def __init__(self, path, model_name, model_version):
+        self.path = path
+        self.model_name = model_name
+        self.model_version = model_version
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS annotations (key TEXT PRIMARY KEY, tokens TEXT NOT NULL)")
+        self.connection.commit()
+
+    def make_key(self, sentence):
+        """
+            Function to compute the key of a sentence.
+
+            Arguments
+            ---------
+            sentence : str
+                Normalized sentence given to the model.
+
+            Returns
+            -------
+            The hexadecimal sha256 of the model name, model version and sentence.
+        """
+        content = '\0'.join([self.model_name, self.model_version, str(sentence)])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get_many(self, sentences):
+        """
+            Function to get the cached annotations of several sentences.
+
+            Arguments
+            ---------
+            sentences : list[str]
+
+            Returns
+            -------
+            A list with, for each sentence, its list of (text, lemma, pos) tuples or None if not cached.
+        """
+        keys = [self.make_key(s) for s in sentences]
+        found = {}
+        # stay under the SQLite limit of variables per query
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            query = "SELECT key, tokens FROM annotations WHERE key IN (" + ','.join('?' * len(chunk)) + ")"
+            for key, tokens in self.connection.execute(query, chunk):
+                found[key] = [tuple(t) for t in json.loads(tokens)]
+        annotations = [found.get(k) for k in keys]
+        misses = annotations.count(None)
+        self.misses += misses
+        self.hits += len(annotations) - misses
+        count("nlp_cache_hits", len(annotations) - misses)
+        count("nlp_cache_misses", misses)
+        return annotations
+
+    def put_many(self, sentences, annotations):
+        """
+            Function to store the annotations of several sentences.
+
+            Arguments
+            ---------
+            sentences : list[str]
+            annotations : list[list[tuple]]
+                (text, lemma, pos) tuples of the tokens of each sentence.
+        """
+        self.connection.executemany("INSERT OR REPLACE INTO annotations (key, tokens) VALUES (?, ?)",
+                                    [(self.make_key(s), json.dumps(a, ensure_ascii=False))
+                                     for s, a in zip(sentences, annotations)])
+        self.connection.commit()
+
+    def report(self):
+        """Function to print the number of hits and misses of the cache."""
+        print("*** NLP cache " + self.path + " : " + str(self.hits) + " hits, " + str(self.misses) + " misses ***\n")
+
+    def close(self):
+        self.connection.close()
+
+
+def load_annotation_cache(path, model_name):
+    """
+        Function to open (or create) the annotation cache of a spacy model.
+
+        Arguments
+        ---------
+        path : str
+            Path of the SQLite file, or None to not use a cache.
+        model_name : str
+            Name of the spacy model.
+
+        Returns
+        -------
+        An `AnnotationCache`, or None if no path is given.
+    """
+    if not path:
+        return None
+    return AnnotationCache(path, model_name, get_model_version(model_name))
+
+
+def get_model_version(model_name):
+    """
+        Function to get the version of an installed spacy model without loading it (nor spacy).
+
+        Arguments
+        ---------
+        model_name : str
+            Name of the spacy model.
+
+        Returns
+        -------
+        The version of the model package, "unknown" if it is not an installed package.
+    """
+    try:
+        return metadata.version(model_name)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def iter_chunks(iterable, size):
+    """
+        Function to split an iterable into lists of a given size.
+
+        Arguments
+        ---------
+        iterable : iterable
+        size : int
+
+        Returns
+        -------
+        A generator of lists with at most `size` elements.
+    """
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_annotations(sentences, spacy_model, batch_size=32, n_process=1, cache=None, chunk_size=1000):
+    """
+        Function to tokenize, lemmatize and pos tag sentences lazily in batches with `nlp.pipe`.
+
+        Arguments
+        ---------
+        sentences : iterable[str]
+            Sentences to process.
+        spacy_model : `spacy.lang` or str
+            Spacy model to use, or its name to use it from the annotation server if it is running,
+            else to load it only if a sentence is not in the cache.
+        batch_size : int
+            Number of sentences sent together to the model.
+        n_process : int
+            Number of worker processes used by spacy.
+        cache : AnnotationCache
+            Cache of the annotations, the model is only run on the sentences not found in it.
+        chunk_size : int
+            Number of sentences looked up together in the cache (or sent together to the annotation server).
+
+        Returns
+        -------
+        A generator with, for each sentence in order, the list of (text, lemma, pos) tuples of its tokens.
+    """
+    # a model given by name is used from the annotation server if it is running, else loaded in this process
+    client = connect_annotation_server(backend="spacy", model=spacy_model) if isinstance(spacy_model, str) else None
+    try:
+        if cache is None and client is None:
+            if isinstance(spacy_model, str):
+                spacy_model = load_spacy_model(spacy_model)
+            docs = iter(spacy_model.pipe(sentences, batch_size=batch_size, n_process=n_process))
+            while True:
+                # the model is lazy, only the time to get each annotated sentence is counted as nlp
+                with stage("nlp"):
+                    doc = next(docs, None)
+                    tokens = None if doc is None else [(token.text, token.lemma_, token.pos_) for token in doc]
+                if tokens is None:
+                    return
+                count("sentences_annotated")
+                count("tokens_annotated", len(tokens))
+                yield tokens
+        for chunk in iter_chunks(sentences, chunk_size):
+            annotations = cache.get_many(chunk) if cache else [None] * len(chunk)
+            missing = [i for i, a in enumerate(annotations) if a is None]
+            if missing:
+                to_annotate = [chunk[i] for i in missing]
+                if client is not None:
+                    with stage("nlp"):
+                        computed = client.annotate("spacy", spacy_model, to_annotate, batch_size)
+                    count("annotation_server_sentences", len(to_annotate))
+                else:
+                    if isinstance(spacy_model, str):
+                        spacy_model = load_spacy_model(spacy_model)
+                    with stage("nlp"):
+                        computed = [[(token.text, token.lemma_, token.pos_) for token in doc]
+                                    for doc in spacy_model.pipe(to_annotate, batch_size=batch_size,
+                                                                n_process=n_process)]
+                count("sentences_annotated", len(computed))
+                count("tokens_annotated", sum(len(tokens) for tokens in computed))
+                if cache:
+                    cache.put_many(to_annotate, computed)
+                for i, a in zip(missing, computed):
+                    annotations[i] = a
+            yield from annotations
+    finally:
+        if client is not None:
+            client.close()
+
+
+class AnnotationClient:
+    """Class which sends sentences to the annotation server (annotation_server.py) and reads their annotations.
+    Requests and answers are json objects, one per line, on a Unix socket."""
+
+    def __init__(self, socket_path=ANNOTATION_SERVER_SOCKET, timeout=None):
+        self.socket_path = socket_path
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.settimeout(timeout)
+        try:
+            self.connection.connect(socket_path)
+        except OSError:
+            self.connection.close()
+            raise
+        self.file = self.connection.makefile('rwb')
+
+    def request(self, message):
+        """
+            Function to send a request to the server and wait for its answer.
+
+            Arguments
+            ---------
+            message : dict
+                Json request.
+
+            Returns
+            -------
+            The json answer of the server.
+        """
+        self.file.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The annotation server closed the connection")
+        answer = json.loads(line)
+        if "error" in answer:
+            raise RuntimeError("Annotation server : " + answer["error"])
+        return answer
+
+    def annotate(self, backend, model, sentences, batch_size=32):
+        """
+            Function to annotate sentences with a model of the server.
+
+            Arguments
+            ---------
+            backend : str
+                "spacy" or "stanza".
+            model : str
+                Name of the spacy model, or language of the stanza pipeline.
+            sentences : list[str]
+            batch_size : int
+                Number of sentences sent together to the model by the server.
+
+            Returns
+            -------
+            A list with, for each sentence, the list of (text, lemma, pos) tuples of its tokens (words for stanza).
+        """
+        answer = self.request({"backend": backend, "model": model, "sentences": list(sentences),
+                               "batch_size": batch_size})
+        return [[tuple(t) for t in tokens] for tokens in answer["annotations"]]
+
+    def models(self):
+        """
+            Function to get the models loaded by the server (the only ones it uses).
+
+            Returns
+            -------
+            A dict with, for each backend ("spacy" and "stanza"), the list of its models.
+        """
+        answer = self.request({"command": "models"})
+        return {backend: answer.get(backend, []) for backend in ["spacy", "stanza"]}
+
+    def close(self):
+        self.file.close()
+        self.connection.close()
+
+
+def connect_annotation_server(socket_path=ANNOTATION_SERVER_SOCKET, backend=None, model=None):
+    """
+        Function to connect to the annotation server if it is running. Only a socket owned by the current user is
+        used, so another user cannot answer with forged annotations.
+
+        Arguments
+        ---------
+        socket_path : str
+            Path of the Unix socket of the server, or "" to not use a server.
+        backend : str
+            "spacy" or "stanza", to connect only if the server has loaded `model`.
+        model : str
+            Name of the spacy model, or language of the stanza pipeline.
+
+        Returns
+        -------
+        An `AnnotationClient`, or None if no server is running (or if it has not loaded the model).
+    """
+    if not socket_path or not hasattr(socket, "AF_UNIX") or not is_own_socket(socket_path):
+        return None
+    try:
+        client = AnnotationClient(socket_path)
+    except OSError:
+        return None
+    if backend is not None:
+        try:
+            served = model in client.models()[backend]
+        except (OSError, ValueError, RuntimeError):
+            served = False
+        if not served:
+            client.close()
+            return None
+    return client
+
+
+def annotate_sentences(sentences, spacy_model, batch_size=32, n_process=1, cache=None):
+    """
+        Function to tokenize, lemmatize and pos tag sentences in batches with `nlp.pipe`.
+
+        Arguments
+        ---------
+        sentences : list[str]
+            Sentences to process.
+        spacy_model : `spacy.lang` or str
+            Spacy model to use, or its name to load it only if needed.
+        batch_size : int
+            Number of sentences sent together to the model.
+        n_process : int
+            Number of worker processes used by spacy.
+        cache : AnnotationCache
+            Cache of the annotations.
+
+        Returns
+        -------
+        A list with, for each sentence, the list of (text, lemma, pos) tuples of its tokens.
+    """
+    return list(iter_annotations(sentences, spacy_model, batch_size, n_process, cache))
+
+
+def iter_ufsac_sentences(xml_file, annotated_only=False):
+    """
+        Function to read the sentences of a UFSAC xml file lazily, without loading the whole file in memory.
+        The sentences, paragraphs and documents are cleared and detached from their parent once read, so the memory
+        used does not depend on the size of the file (nor on the number of sentences of a document).
+
+        Arguments
+        ---------
+        xml_file : str
+            Path of the xml file (or file object).
+        annotated_only : bool
+            If True, only the words with a sense (wn30_key) are kept.
+
+        Returns
+        -------
+        A generator of dicts with the document id, the sentence id and the list of words of each sentence.
+        Each word is a dict with the UFSAC attributes (None if missing).
+    """
+    # open elements, from the root to the current one
+    parents = []
+    document = None
+    for event, element in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            if element.tag == "document":
+                document = element.get("id")
+            continue
+        parents.pop()
+        if element.tag == "sentence":
+            words = [{a: w.get(a) for a in UFSAC_WORD_ATTRIBUTES} for w in element
+                     if w.tag == "word" and (not annotated_only or w.get("wn30_key"))]
+            yield {"document": document, "id": element.get("id"), "words": words}
+        if element.tag in ["sentence", "paragraph", "document"]:
+            element.clear()
+            # the previous siblings are already removed, so the element is the first child of its parent
+            if parents:
+                parents[-1].remove(element)
+
+
+def iter_ufsac_documents(xml_file, annotated_only=False):
+    """
+        Function to read the documents of a UFSAC xml file lazily.
+
+        Arguments
+        ---------
+        xml_file : str
+            Path of the xml file (or file object).
+        annotated_only : bool
+            If True, only the words with a sense (wn30_key) are kept.
+
+        Returns
+        -------
+        A generator of (document id, generator of the sentences of the document) tuples,
+        with the sentences given by `iter_ufsac_sentences`.
+        As with `itertools.groupby`, the sentences of a document must be read before the next document.
+    """
+    for document, sentences in groupby(iter_ufsac_sentences(xml_file, annotated_only), lambda s: s["document"]):
+        yield document, sentences
+
+
+def iter_ufsac_words(xml_file, annotated_only=False):
+    """
+        Function to read the words of a UFSAC xml file lazily.
+
+        Arguments
+        ---------
+        xml_file : str
+            Path of the xml file (or file object).
+        annotated_only : bool
+            If True, only the words with a sense (wn30_key) are kept.
+
+        Returns
+        -------
+        A generator of dicts with the UFSAC attributes of each word, its document id and its sentence id.
+    """
+    for sentence in iter_ufsac_sentences(xml_file, annotated_only):
+        for word in sentence["words"]:
+            word["document"] = sentence["document"]
+            word["sentence"] = sentence["id"]
+            yield word
+
+
 def create_directory(outdir, name=None):
     """
         Function to create a directory if it does not exist.
@@ -114,17 +1008,169 @@ def parse_wn31_file(file):
         -------
         A dataframe with the wanted information.
     """
+    import pandas as pd
     return pd.read_csv(file, delimiter=" ", names=["sense_key", "synset", "id1", "id2"], header=None)
 
 
-def get_sense_key_from_synset(wn31_data, synset_key):
+class WordNetSenseIndex:
+    """Class which indexes the WordNet 3.1 index.sense file in both directions :
+    synset offset -> list of sense keys, and sense key -> synset offset.
+    It is built once and gives constant time lookups instead of scanning the whole table for each synset."""
+
+    def __init__(self):
+        self.offset_to_keys = {}
+        self.key_to_offset = {}
+
+    @classmethod
+    def from_file(cls, file):
+        """
+            Function to build the index from the index.sense file.
+
+            Arguments
+            ---------
+            file : str
+                Path of WordNet 3.1 file.
+
+            Returns
+            -------
+            The built `WordNetSenseIndex`.
+        """
+        index = cls()
+        with open(file, "r") as f:
+            for line in f:
+                fields = line.split(" ")
+                if len(fields) < 2:
+                    continue
+                index.add(fields[0], int(fields[1]))
+        return index
+
+    @classmethod
+    def from_dataframe(cls, wn31_data):
+        """
+            Function to build the index from the dataframe returned by `parse_wn31_file`.
+
+            Arguments
+            ---------
+            wn31_data : dataframe
+                WordNet 3.1 data.
+
+            Returns
+            -------
+            The built `WordNetSenseIndex`.
+        """
+        index = cls()
+        for sense_key, synset in zip(wn31_data["sense_key"].tolist(), wn31_data["synset"].tolist()):
+            index.add(sense_key, int(synset))
+        return index
+
+    def add(self, sense_key, offset):
+        """
+            Function to add a sense key and its synset offset to the index.
+
+            Arguments
+            ---------
+            sense_key : str
+            offset : int
+        """
+        self.offset_to_keys.setdefault(offset, []).append(sense_key)
+        self.key_to_offset[sense_key] = offset
+
+    @staticmethod
+    def normalize_offset(synset):
+        """
+            Function to get the integer offset from a synset (02209508, "02209508" or "02209508-n").
+
+            Arguments
+            ---------
+            synset : int or str
+
+            Returns
+            -------
+            The offset as an int, or None if the synset is empty or not valid.
+        """
+        if isinstance(synset, int):
+            return synset
+        try:
+            return int(str(synset).split("-")[0])
+        except ValueError:
+            return None
+
+    def lookup(self, synset):
+        """
+            Function to get the sense key(s) of a synset.
+
+            Arguments
+            ---------
+            synset : int or str
+
+            Returns
+            -------
+            A list with the sense key(s), empty if the synset is unknown.
+        """
+        count("wordnet_lookups")
+        return list(self.offset_to_keys.get(self.normalize_offset(synset), []))
+
+    def lookup_many(self, synsets):
+        """
+            Function to get the sense key(s) of several synsets at once.
+
+            Arguments
+            ---------
+            synsets : list
+                List of synsets (int or str).
+
+            Returns
+            -------
+            A list with, for each synset, the list of its sense key(s).
+        """
+        count("wordnet_lookups", len(synsets))
+        offset_to_keys = self.offset_to_keys
+        normalize = self.normalize_offset
+        return [list(offset_to_keys.get(normalize(s), [])) for s in synsets]
+
+    def offset_of(self, sense_key):
+        """
+            Function to get the synset offset of a sense key.
+
+            Arguments
+            ---------
+            sense_key : str
+
+            Returns
+            -------
+            The offset as an int, or None if the sense key is unknown.
+        """
+        return self.key_to_offset.get(sense_key)
+
+    def __len__(self):
+        return len(self.key_to_offset)
+
+
+def load_wn31_index(file):
+    """
+        Function to load the Wordnet 3.1 file into a `WordNetSenseIndex`.
+
+        Arguments
+        ---------
+        file : str
+            Path of WordNet 3.1 file.
+
+        Returns
+        -------
+        A `WordNetSenseIndex` with the sense keys of each synset.
+    """
+    with stage("load index.sense"):
+        return WordNetSenseIndex.from_file(file)
+
+
+def get_sense_key_from_synset(wn31_index, synset_key):
     """
         Function to get the sense key(s) from a synset.
 
         Arguments
         ---------
-        wn31_data : dataframe
-            WordNet 3.1 data.
+        wn31_index : WordNetSenseIndex
+            WordNet 3.1 index.
         synset_key : str
             String to look for.
 
@@ -132,22 +1178,23 @@ def get_sense_key_from_synset(wn31_data, synset_key):
         -------
         A list with the possible sense key(s).
     """
-    if not wn31_data.loc[wn31_data['synset'] == int(synset_key)]["sense_key"].tolist():
+    sense_keys = wn31_index.lookup(synset_key)
+    if not sense_keys:
         return []
     else:
-        return str(wn31_data.loc[wn31_data['synset'] == int(synset_key)]["sense_key"].tolist()[0])
+        return str(sense_keys[0])
 
 
-def get_sense_keys_from_synset_wolf(wn31_data, picto_table, synset_wolf):
+def get_sense_keys_from_synset_wolf(wn31_index, wolf_synset_index, synset_wolf):
     """
         Function to get the sense key(s) from a synset.
 
         Arguments
         ---------
-        wn31_data : dataframe
-            WordNet 3.1 data.
-        picto_table : dataframe
-            Data from arasaac.fr
+        wn31_index : WordNetSenseIndex
+            WordNet 3.1 index.
+        wolf_synset_index : dict
+            Index built with `build_wolf_synset_index` from arasaac.fr data.
         synset_wolf : str
             String to look for.
 
@@ -155,36 +1202,98 @@ def get_sense_keys_from_synset_wolf(wn31_data, picto_table, synset_wolf):
         -------
         A list with the possible sense key(s) for a given synset.
     """
-    synset_ids_from_synset_wolf = list(
-        set(picto_table.loc[picto_table['synset'] == synset_wolf]["synset2_proc"].tolist()))
     sense_keys = []
-    for synset in synset_ids_from_synset_wolf:
-        sense_key = get_sense_key_from_synset(wn31_data, synset)
+    for synset in wolf_synset_index.get(synset_wolf, []):
+        sense_key = get_sense_key_from_synset(wn31_index, synset)
         sense_keys.append(sense_key)
     return sense_keys
 
 
-def get_sense_key_from_synset_2(synset, data_wn31):
+def get_sense_key_from_synset_2(synset, wn31_index):
     """
         Function to get the associated sense key(s) to the synset.
 
         Arguments
         ---------
         synset : str
-        data_wn31 : dataframe
-            Dataframe with the WordNet 3.1 infos.
+        wn31_index : WordNetSenseIndex
+            Index with the WordNet 3.1 infos.
 
         Returns
         -------
         An empty list or a list with sense key(s).
     """
-    if synset != "" or synset != "0":
-        synset_to_search = synset.split("-")[0]
-        rows_with_synset = data_wn31.loc[data_wn31['synset'] == int(synset_to_search)]
-        sense_keys = rows_with_synset["sense_key"].tolist()
-        return sense_keys
-    else:
-        return [""]
+    return wn31_index.lookup(synset)
+
+
+class SynsetNameTable:
+    """Class which stores on disk (SQLite) the name of the wordnet synset of each sense key (e.g. "bee%1:05:00::" ->
+    "bee.n.01"). It is built once from NLTK WordNet, so the scripts get synset names without loading WordNet."""
+
+    def __init__(self, path, cache_size=65536):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS synset_names "
+                                "(sense_key TEXT PRIMARY KEY, synset TEXT NOT NULL) WITHOUT ROWID")
+        self.connection.commit()
+        self.lookup = lru_cache(maxsize=cache_size)(self.get_synset_name)
+
+    def get_synset_name(self, sense_key):
+        """
+            Function to get the name of the synset of a sense key (use `lookup` to memoize it).
+
+            Arguments
+            ---------
+            sense_key : str
+
+            Returns
+            -------
+            The synset name, None if the sense key is unknown.
+        """
+        count("synset_table_queries")
+        row = self.connection.execute("SELECT synset FROM synset_names WHERE sense_key = ?",
+                                      (sense_key.lower(),)).fetchone()
+        return row[0] if row else None
+
+    def add_many(self, pairs):
+        """
+            Function to add (or replace) sense keys in the table.
+
+            Arguments
+            ---------
+            pairs : iterable[tuple]
+                (sense key, synset name) pairs.
+        """
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO synset_names (sense_key, synset) VALUES (?, ?)",
+                                        ((k.lower(), n) for k, n in pairs))
+        self.lookup.cache_clear()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM synset_names").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+def load_synset_name_table(path):
+    """
+        Function to open the table of synset names built by build_synset_name_table.py.
+
+        Arguments
+        ---------
+        path : str
+            Path of the SQLite file, or None to not use a table.
+
+        Returns
+        -------
+        A `SynsetNameTable`, or None if no path is given.
+    """
+    if not path:
+        return None
+    if not os.path.isfile(path):
+        raise FileNotFoundError("No synset name table at " + path + ", build it with build_synset_name_table.py")
+    return SynsetNameTable(path)
 
 
 def load_picto_table(filepath):
@@ -200,6 +1309,7 @@ def load_picto_table(filepath):
     -------
     Dictionary containing the table with : lemma as key, list of pictogram information as value.
     """
+    import pandas as pd
     try:
         # Read the csv file with pandas
         df = pd.read_csv(filepath)
@@ -214,3 +1324,65 @@ def load_picto_table(filepath):
     except IOError:
         print("Could not read file, wrong file format.", filepath)
         return
+
+
+def read_tsv_file(tsv_file):
+    """
+        Function to read the data into a dataframe from arasaac.fre30bis.
+
+        Arguments
+        ---------
+        tsv_file : str
+            Path of the .tsv file.
+
+        Returns
+        -------
+        A pandas dataframe with the data.
+    """
+    import pandas as pd
+    data = pd.read_csv(tsv_file, sep=',')
+    data["synset2"] = data["synset2"].replace("\\N", "0")
+    return data
+
+
+def build_lemma_index(data_arasaac):
+    """
+        Function to index the arasaac.fre30bis data by lemma.
+
+        Arguments
+        ---------
+        data_arasaac : dataframe
+            Dataframe with the arasaac.fre30 infos (from `read_tsv_file` or `load_picto_table`).
+
+        Returns
+        -------
+        A dict with, for each lemma, a tuple (set of picto ids, list of synset2).
+    """
+    index = {}
+    for lemma, id_picto, synset in zip(data_arasaac["lemma"].tolist(), data_arasaac["idpicto"].tolist(),
+                                       data_arasaac["synset2"].tolist()):
+        ids, synsets = index.setdefault(lemma, (set(), []))
+        ids.add(id_picto)
+        synsets.append(synset)
+    return index
+
+
+def build_wolf_synset_index(picto_table):
+    """
+        Function to index the arasaac.fr data by wolf synset.
+
+        Arguments
+        ---------
+        picto_table : dataframe
+            Data from arasaac.fr, loaded with `load_picto_table`.
+
+        Returns
+        -------
+        A dict with, for each wolf synset, the list of the unique corresponding synset2 (without pos).
+    """
+    index = {}
+    for synset_wolf, synset in zip(picto_table["synset"].tolist(), picto_table["synset2_proc"].tolist()):
+        synsets = index.setdefault(synset_wolf, [])
+        if synset not in synsets:
+            synsets.append(synset)
+    return index